@@ -1,5 +1,5 @@
 import os
-from flask import Flask, send_from_directory # 1. Import send_from_directory
+from flask import Flask, redirect, url_for
 from config import Config
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
@@ -18,7 +18,10 @@ def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
 
-    UPLOAD_FOLDER = os.path.join(app.root_path, '..', 'uploads')
+    from .utils.json_provider import FastJSONProvider
+    app.json = FastJSONProvider(app)
+
+    UPLOAD_FOLDER = app.config.get('UPLOAD_FOLDER') or os.path.join(app.root_path, '..', 'uploads')
     app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
     if not os.path.exists(UPLOAD_FOLDER):
@@ -27,7 +30,22 @@ def create_app(config_class=Config):
     # 2. Correctly define the route to serve uploaded files
     @app.route('/uploads/<path:filename>')
     def uploaded_file(filename):
-        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+        from .utils.static_files import serve_upload
+        return serve_upload(filename)
+
+    # Thumbnails and web-sized copies, rendered on first request if missing
+    @app.route('/uploads/derived/<any(thumb, web):variant>/<path:filename>')
+    def derived_file(variant, filename):
+        from .utils.derivatives import derivatives
+        from .utils.static_files import serve_upload
+        derived = derivatives.ensure(variant, filename)
+        if derived:
+            return serve_upload(derived)
+        # Not rendered (Pillow missing, variant off, render timed out): point at
+        # the original without letting caches pin it under the derived URL.
+        response = redirect(url_for('uploaded_file', filename=filename))
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
 
     CORS(app)
     db.init_app(app)
@@ -36,6 +54,45 @@ def create_app(config_class=Config):
     bcrypt.init_app(app)
     mail.init_app(app)
 
+    from .utils.metrics import request_metrics
+    request_metrics.init_app(app)
+
+    from .utils.geo_cache import geocode_cache, route_cache
+    geocode_cache.init_app(app)
+    route_cache.init_app(app)
+
+    from .utils.geo_client import geo_client
+    geo_client.init_app(app)
+
+    from .utils.broadcaster import parcel_broadcaster
+    parcel_broadcaster.init_app(app)
+
+    from .utils.principal import user_flags
+    user_flags.init_app(app)
+
+    from .utils.passwords import password_hasher
+    password_hasher.init_app(app)
+
+    from .utils.mailer import outbox_mailer
+    outbox_mailer.init_app(app)
+
+    from .utils.notifications import notification_coalescer
+    notification_coalescer.init_app(app)
+
+    from .utils.storage import upload_store
+    upload_store.init_app(app)
+
+    from .utils.derivatives import derivatives
+    derivatives.init_app(app)
+
+    @app.errorhandler(413)
+    def request_too_large(e):
+        return {'message': upload_store.limit_message()}, 413
+
+    from .cli import outbox_cli, parcels_cli
+    app.cli.add_command(parcels_cli)
+    app.cli.add_command(outbox_cli)
+
     with app.app_context():
         from .routes import auth, parcels, admin
         app.register_blueprint(auth.auth_bp, url_prefix='/api/auth')
@@ -0,0 +1,212 @@
+"""
+Asyncio serving path for long-lived tracking streams.
+
+`/api/parcels/<id>/stream` and the multiplexed `/api/parcels/watch` are served
+by coroutines, so an idle tracker costs a small mailbox on the event loop
+instead of a WSGI worker thread. Every other request is passed to the regular
+Flask app through asgiref's WSGI adapter, so all existing blueprints keep
+working unchanged.
+"""
+import asyncio
+import json
+import re
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi
+from flask_cors.core import get_cors_headers, get_cors_options
+from flask_jwt_extended import decode_token
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
+from werkzeug.datastructures import Headers
+
+from app import db
+from app.models.parcel import Parcel
+from app.routes.parcels import parse_watch_request
+from app.utils.broadcaster import (
+    parcel_broadcaster, AsyncSubscription, END, RESYNC, RESYNC_MESSAGE, StreamCursor, format_watch_event,
+)
+from app.utils.events import event_dict, events_after, parse_event_id
+from app.utils.mailer import outbox_mailer
+from app.utils.principal import resolve_principal
+
+STREAM_PATH = re.compile(r'^/api/parcels/(\d+)/stream$')
+WATCH_PATH = '/api/parcels/watch'
+SSE_HEADERS = [
+    (b'content-type', b'text/event-stream'),
+    (b'cache-control', b'no-cache'),
+    (b'x-accel-buffering', b'no'),
+]
+
+
+class StreamingApp:
+    """ASGI application that serves tracking streams itself and delegates the rest to Flask."""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        # Same options CORS(app) resolves (CORS_* config), so both paths answer cross-origin alike.
+        self.cors_options = get_cors_options(flask_app)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            if scope['path'] == WATCH_PATH:
+                return await self.watch_stream(scope, receive, send)
+            match = STREAM_PATH.match(scope['path'])
+            if match:
+                return await self.parcel_stream(scope, receive, send, int(match.group(1)))
+        return await self.wsgi(scope, receive, send)
+
+    async def parcel_stream(self, scope, receive, send, parcel_id):
+        token = self._token_from(scope)
+        if not token:
+            return await self._send_json(scope, send, 401, {'msg': 'Missing Authorization Header'})
+
+        last_event_id = parse_event_id(self._header(scope, b'last-event-id') or self._query(scope).get('last_event_id'))
+        status, result = await sync_to_async(self._authorize, thread_sensitive=False)(token, parcel_id, last_event_id)
+        if status != 200:
+            return await self._send_json(scope, send, status, result)
+
+        subscription = AsyncSubscription(parcel_id, asyncio.get_running_loop())
+        parcel_broadcaster.subscribe(parcel_id, subscription)
+        cursor = StreamCursor(last_event_id)
+
+        def render(payload):
+            if payload is END:
+                return "event: end\ndata: {}\n\n", True
+            return cursor.render(payload), False
+
+        await self._relay(scope, receive, send, subscription, render, cursor.missed(result))
+
+    async def watch_stream(self, scope, receive, send):
+        token = self._token_from(scope)
+        if not token:
+            return await self._send_json(scope, send, 401, {'msg': 'Missing Authorization Header'})
+
+        query = self._query(scope)
+        status, result = await sync_to_async(self._authorize_watch, thread_sensitive=False)(token, query)
+        if status != 200:
+            return await self._send_json(scope, send, status, result)
+
+        subscription = AsyncSubscription(None, asyncio.get_running_loop(), maxsize=256)
+        parcel_broadcaster.watch(result, subscription)
+        await self._relay(scope, receive, send, subscription, lambda event: (format_watch_event(event), False))
+
+    async def _relay(self, scope, receive, send, subscription, render, preamble=()):
+        """
+        Streams a subscription's events as SSE until the client leaves or
+        `render` says stop. `render` may return a None chunk to skip an event.
+        """
+        watcher = asyncio.ensure_future(self._watch_disconnect(receive, subscription))
+        try:
+            await send({'type': 'http.response.start', 'status': 200, 'headers': SSE_HEADERS + self._cors(scope)})
+            for chunk in preamble:
+                await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+            while True:
+                event = await subscription.get(timeout=parcel_broadcaster.keepalive)
+                if event is AsyncSubscription.CLOSED:
+                    break
+                if event is None:
+                    chunk, last = ": keepalive\n\n", False
+                elif event is RESYNC:
+                    chunk, last = RESYNC_MESSAGE, True
+                else:
+                    chunk, last = render(event)
+                    if chunk is None:
+                        continue
+                await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': not last})
+                if last:
+                    break
+        finally:
+            watcher.cancel()
+            parcel_broadcaster.unsubscribe(subscription)
+
+    def _decode(self, token):
+        """Returns (principal, None) for a valid access token, else (None, (status, body))."""
+        try:
+            claims = decode_token(token)
+        except (JWTExtendedException, PyJWTError) as e:
+            return None, (401, {'msg': str(e)})
+        if claims.get('type') != 'access':
+            return None, (422, {'msg': 'Only non-refresh tokens are allowed'})
+        return resolve_principal(claims), None
+
+    def _authorize_watch(self, token, query):
+        """Same checks and filter parsing as the Flask watch route."""
+        with self.flask_app.app_context():
+            principal, error = self._decode(token)
+            if error:
+                return error
+            try:
+                return 200, parse_watch_request(query, principal.user_id, principal.is_admin)
+            except ValueError as e:
+                return 400, {'message': str(e)}
+
+    def _authorize(self, token, parcel_id, last_event_id=None):
+        """
+        Same checks as the Flask stream route: a valid access token from the
+        owner or an admin. Returns (200, events missed since `last_event_id`).
+        """
+        with self.flask_app.app_context():
+            principal, error = self._decode(token)
+            if error:
+                return error
+            parcel = db.session.get(Parcel, parcel_id)
+            if not parcel:
+                return 404, {'message': 'Parcel not found'}
+            if not principal.can_access(parcel.user_id):
+                return 403, {'message': 'Access forbidden'}
+            if last_event_id is None:
+                return 200, []
+            return 200, [event_dict(event) for event in events_after(parcel_id, last_event_id)]
+
+    def _token_from(self, scope):
+        authorization = self._header(scope, b'authorization')
+        if authorization and authorization.lower().startswith('bearer '):
+            return authorization[7:].strip()
+        # EventSource cannot set headers, so browsers pass ?jwt=<token> instead.
+        param = self.flask_app.config.get('JWT_QUERY_STRING_NAME', 'jwt')
+        return self._query(scope).get(param)
+
+    def _header(self, scope, name):
+        for key, value in scope['headers']:
+            if key == name:
+                return value.decode('latin-1')
+        return None
+
+    def _query(self, scope):
+        return {key: values[0] for key, values in parse_qs(scope.get('query_string', b'').decode('latin-1')).items()}
+
+    async def _watch_disconnect(self, receive, subscription):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        subscription.close()
+
+    def _cors(self, scope):
+        """The CORS headers Flask-CORS would add to this request's response."""
+        request_headers = Headers([(key.decode('latin-1'), value.decode('latin-1')) for key, value in scope['headers']])
+        headers = get_cors_headers(self.cors_options, request_headers, scope['method'])
+        return [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers.items(multi=True)]
+
+    async def _send_json(self, scope, send, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', b'application/json'), (b'content-length', str(len(payload)).encode()),
+            ] + self._cors(scope),
+        })
+        await send({'type': 'http.response.body', 'body': payload})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                outbox_mailer.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
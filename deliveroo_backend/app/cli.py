@@ -0,0 +1,92 @@
+"""
+`flask parcels ...` and `flask outbox ...` maintenance commands.
+
+    flask --app run parcels import manifest.csv --user-id 7
+    flask --app run parcels export parcels.csv.gz --status Delivered --from 2025-01-01
+    flask --app run parcels rebuild-rollups
+    flask --app run outbox drain
+"""
+import json
+import sys
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from app import db
+from app.models.user import User
+
+parcels_cli = AppGroup('parcels', help='Bulk parcel operations.')
+outbox_cli = AppGroup('outbox', help='Email outbox operations.')
+
+
+@parcels_cli.command('import')
+@click.argument('source', type=click.File('rb'))
+@click.option('--user-id', type=int, help='Owner for rows without a user_id column.')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help='Defaults to the file extension.')
+@click.option('--batch-size', type=int, help='Rows per INSERT batch (default IMPORT_BATCH_SIZE).')
+def import_command(source, user_id, fmt, batch_size):
+    """Import parcels from a CSV or NDJSON manifest ('-' reads stdin)."""
+    from app.utils.importer import detect_format, import_parcels
+
+    fmt = fmt or detect_format(None, source.name)
+    if fmt is None:
+        raise click.UsageError('Cannot tell the format from the file name; pass --format.')
+    if user_id is not None and db.session.get(User, user_id) is None:
+        raise click.BadParameter(f'User {user_id} does not exist', param_hint='--user-id')
+
+    report = import_parcels(
+        source, fmt, user_id,
+        batch_size=batch_size or current_app.config.get('IMPORT_BATCH_SIZE', 1000),
+        allow_user_column=True,
+    ).as_dict()
+    click.echo(json.dumps(report, indent=2))
+    if report['failed']:
+        sys.exit(1)
+
+
+@parcels_cli.command('export')
+@click.argument('target', type=click.File('wb'))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson', 'parquet']), default='csv')
+@click.option('--status', help='Only parcels with this status.')
+@click.option('--user-id', type=int, help="Only this user's parcels.")
+@click.option('--from', 'start', help='Created on or after this ISO date.')
+@click.option('--to', 'end', help='Created on or before this ISO date.')
+@click.option('--gzip/--no-gzip', 'compress', default=True, help='Gzip CSV and NDJSON output (default on).')
+def export_command(target, fmt, status, user_id, start, end, compress):
+    """Stream parcels to a CSV, NDJSON or Parquet file ('-' writes stdout)."""
+    from app.utils.exporter import ExportUnavailable, export_query, parse_date, stream_export
+    from app.utils.serializers import ADMIN_PARCEL_FIELDS
+
+    try:
+        query = export_query(
+            ADMIN_PARCEL_FIELDS, status=status, user_id=user_id,
+            start=parse_date(start), end=parse_date(end, end=True),
+        )
+        chunks = stream_export(query, ADMIN_PARCEL_FIELDS, fmt, compress)
+    except (ValueError, ExportUnavailable) as e:
+        raise click.UsageError(str(e))
+    size = 0
+    for chunk in chunks:
+        target.write(chunk)
+        size += len(chunk)
+    click.echo(f'Wrote {size} bytes', err=True)
+
+
+@parcels_cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Recompute the dashboard's daily status rollups from the parcels table."""
+    from app.utils.rollups import rebuild_rollups
+
+    rows = rebuild_rollups()
+    click.echo(f'Rebuilt {rows} rollup rows')
+
+
+@outbox_cli.command('drain')
+@click.option('--timeout', type=float, default=60.0, help='Give up after this many seconds (default 60).')
+def drain_command(timeout):
+    """Send every email that is due now, retries and digests included."""
+    from app.utils.mailer import outbox_mailer
+
+    outbox_mailer.drain(timeout)
+    click.echo(json.dumps(outbox_mailer.stats(), indent=2))
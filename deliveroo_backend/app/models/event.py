@@ -0,0 +1,17 @@
+from app import db
+
+class ParcelEvent(db.Model):
+    """One change to a parcel. Rows are only ever appended."""
+    __tablename__ = 'parcel_events'
+    __table_args__ = (
+        db.Index('ix_parcel_events_parcel_id_id', 'parcel_id', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    parcel_id = db.Column(db.Integer, db.ForeignKey('parcels.id'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # created, status, location, destination, image, proof
+    value = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+
+    def __repr__(self):
+        return f'<ParcelEvent {self.parcel_id} {self.kind}>'
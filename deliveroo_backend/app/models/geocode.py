@@ -0,0 +1,13 @@
+from app import db
+
+class GeocodeCacheEntry(db.Model):
+    __tablename__ = 'geocode_cache'
+
+    address_key = db.Column(db.String(255), primary_key=True)  # Normalized address
+    lat = db.Column(db.Float, nullable=True)  # Null lat/lon marks a failed (negative) lookup
+    lon = db.Column(db.Float, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+
+    def __repr__(self):
+        return f'<GeocodeCacheEntry {self.address_key}>'
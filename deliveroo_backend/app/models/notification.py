@@ -0,0 +1,20 @@
+from datetime import datetime, timezone
+from app import db
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class ParcelNotification(db.Model):
+    """A parcel change waiting to be folded into its owner's next digest email."""
+    __tablename__ = 'parcel_notifications'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    parcel_id = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # 'status' or 'location'
+    value = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=_utcnow, index=True)  # UTC
+
+    def __repr__(self):
+        return f'<ParcelNotification {self.parcel_id} {self.kind}>'
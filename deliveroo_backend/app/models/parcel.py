@@ -3,6 +3,10 @@ from sqlalchemy.orm import relationship
 
 class Parcel(db.Model):
     __tablename__ = 'parcels'
+    __table_args__ = (
+        db.Index('ix_parcels_created_at_id', 'created_at', 'id'),  # Keyset pagination
+        db.Index('ix_parcels_user_id_created_at', 'user_id', 'created_at'),  # Per-user listing
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -10,7 +14,7 @@ class Parcel(db.Model):
     pickup_location = db.Column(db.String(255), nullable=False)
     destination = db.Column(db.String(255), nullable=False)
     weight = db.Column(db.Float, nullable=False)
-    status = db.Column(db.String(50), default='Pending')
+    status = db.Column(db.String(50), default='Pending', index=True)
     present_location = db.Column(db.String(255), nullable=True)
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
@@ -0,0 +1,17 @@
+from app import db
+
+class UserRoleChange(db.Model):
+    """
+    One change to a user's `is_admin` flag, or the user's deletion, written
+    in the same transaction. Every process follows this table to stop
+    trusting tokens signed before the change; rows older than the access
+    token lifetime are pruned.
+    """
+    __tablename__ = 'user_role_changes'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)  # No foreign key: deleted users are recorded too
+    changed_at = db.Column(db.DateTime, nullable=False)  # UTC
+
+    def __repr__(self):
+        return f'<UserRoleChange {self.user_id}>'
@@ -0,0 +1,19 @@
+from app import db
+
+class ParcelDailyRollup(db.Model):
+    """
+    Parcel totals per creation day and current status. Kept up to date by
+    every write that creates a parcel or changes its status; rebuilt from
+    `parcels` with `flask parcels rebuild-rollups`.
+    """
+    __tablename__ = 'parcel_daily_rollups'
+
+    day = db.Column(db.Date, primary_key=True)  # Day the parcels were created
+    status = db.Column(db.String(50), primary_key=True)
+    parcels = db.Column(db.Integer, nullable=False, default=0)
+    total_weight = db.Column(db.Float, nullable=False, default=0)
+    shipping_revenue = db.Column(db.Float, nullable=False, default=0)  # Sum of shipping_cost
+    insured_value = db.Column(db.Float, nullable=False, default=0)  # Sum of estimated_cost
+
+    def __repr__(self):
+        return f'<ParcelDailyRollup {self.day} {self.status}>'
@@ -1,5 +1,6 @@
-from app import db, bcrypt
+from app import db
 from sqlalchemy.orm import relationship
+from app.utils.passwords import password_hasher
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -13,10 +14,10 @@ class User(db.Model):
     parcels = relationship('Parcel', back_populates='user')
 
     def set_password(self, password):
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return password_hasher.check(self.password_hash, password)
 
     def __repr__(self):
         return f'<User {self.username}>'
\ No newline at end of file
@@ -1,10 +1,25 @@
-import os
-from werkzeug.utils import secure_filename
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from app.utils.decorators import admin_required
 from app.models.parcel import Parcel
 from app import db
-from app.utils.helpers import send_email, get_full_image_url
+from app.utils.helpers import get_full_image_url, get_thumbnail_url
+from app.utils.mailer import outbox_mailer
+from app.utils.events import record_event, record_events
+from app.utils.exporter import (
+    EXPORT_CONTENT_TYPES, EXPORT_FORMATS, ExportUnavailable, export_filename, export_query, parse_date, stream_export,
+)
+from app.utils.notifications import notification_coalescer
+from app.utils.serializers import ADMIN_PARCEL_FIELDS, parcel_query, select_fields, serialize_parcel, serialize_parcels
+from app.utils.geo_cache import geocode_cache, route_cache
+from app.utils.geo_client import geo_client
+from app.utils.broadcaster import parcel_broadcaster
+from app.utils.passwords import password_hasher
+from app.utils.principal import user_flags
+from app.utils.rollups import TRANSITION_COLUMNS, change_status, rollup_summary
+from app.utils.pagination import keyset_page, newest_first, parse_limit
+from app.utils.search import search_filter, search_parcels
+from app.utils.derivatives import derivatives
+from app.utils.storage import UploadTooLarge, upload_store
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -14,7 +29,17 @@ def get_all_parcels():
     """
     Admin route to get all parcel orders, with optional filtering and searching.
     Accepts query parameters: ?status=<status> and ?search=<term>
+
+    Paging: ?limit=<n> (max 500) and ?cursor=<next_cursor from the previous page>.
+    Without them every parcel is returned; ?stream=1 sends that full list
+    incrementally instead of building it in memory first.
+    ?fields=id,status,... limits the returned fields.
     """
+    try:
+        fields = select_fields(request.args.get('fields'), ADMIN_PARCEL_FIELDS)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
     query = Parcel.query
 
     status_filter = request.args.get('status')
@@ -24,33 +49,107 @@ def get_all_parcels():
         query = query.filter(Parcel.status == status_filter)
     
     if search_term:
-        query = query.filter(Parcel.recipient_name.ilike(f'%{search_term}%'))
+        query = search_filter(query, search_term)
 
-    parcels = query.order_by(Parcel.created_at.desc()).all()
-    
-    output = []
-    for parcel in parcels:
-        parcel_data = {
-            'id': parcel.id,
-            'user_id': parcel.user_id,
-            'recipient_name': parcel.recipient_name,
-            'pickup_location': parcel.pickup_location,
-            'destination': parcel.destination,
-            'weight': parcel.weight,
-            'status': parcel.status,
-            'present_location': parcel.present_location,
-            'created_at': parcel.created_at.isoformat(),
-            'sender_phone': parcel.sender_phone,
-            'recipient_phone': parcel.recipient_phone,
-            'estimated_cost': parcel.estimated_cost, # Insured Value
-            'shipping_cost': parcel.shipping_cost,   # Calculated Cost
-            'parcel_image_url': get_full_image_url(parcel.parcel_image_url),
-            'proof_of_delivery_image_url': get_full_image_url(parcel.proof_of_delivery_image_url)
-        }
-        output.append(parcel_data)
+    query = parcel_query(query, fields)
+
+    if 'limit' in request.args or 'cursor' in request.args:
+        try:
+            limit = parse_limit(request.args.get('limit'))
+            parcels, next_cursor = keyset_page(query, limit, request.args.get('cursor'))
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        return jsonify({
+            'parcels': serialize_parcels(parcels, fields),
+            'next_cursor': next_cursor,
+        }), 200
+
+    if request.args.get('stream') in ('1', 'true'):
+        return Response(stream_with_context(_stream_parcels(query, fields)), mimetype='application/json')
+
+    parcels = newest_first(query).all()
+    output = serialize_parcels(parcels, fields)
 
     return jsonify({'parcels': output}), 200
 
+
+def _stream_parcels(query, fields):
+    """Yields the same document as the unpaged listing, a few hundred rows at a time."""
+    dumps = current_app.json.dumps
+    yield '{"parcels": ['
+    for index, parcel in enumerate(newest_first(query).yield_per(500)):
+        yield (',' if index else '') + dumps(serialize_parcel(parcel, fields))
+    yield ']}'
+
+
+@admin_bp.route('/parcels/export', methods=['GET'])
+@admin_required()
+def export_parcels():
+    """
+    Streams every matching parcel as a file download.
+    Accepts ?format=csv|ndjson|parquet, ?status=, ?user_id=, ?from= and ?to=
+    (ISO dates, inclusive), ?fields= and ?gzip=0 to turn off compression.
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'message': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    try:
+        fields = select_fields(request.args.get('fields'), ADMIN_PARCEL_FIELDS)
+        user_id = request.args.get('user_id') or None
+        if user_id is not None and not user_id.isdecimal():
+            raise ValueError('user_id must be an integer')
+        query = export_query(
+            fields,
+            status=request.args.get('status'),
+            user_id=int(user_id) if user_id else None,
+            start=parse_date(request.args.get('from')),
+            end=parse_date(request.args.get('to'), end=True),
+        )
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    compress = request.args.get('gzip', '1') not in ('0', 'false')
+    try:
+        chunks = stream_export(query, fields, fmt, compress)
+    except ExportUnavailable as e:
+        return jsonify({'message': str(e)}), 501
+
+    response = Response(
+        stream_with_context(chunks),
+        mimetype='application/gzip' if compress and fmt != 'parquet' else EXPORT_CONTENT_TYPES[fmt],
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename="{export_filename(fmt, compress)}"'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@admin_bp.route('/parcels/search', methods=['GET'])
+@admin_required()
+def search_all_parcels():
+    """
+    Ranked search over recipient name, locations and phone numbers.
+    Accepts ?q=<term>, ?limit=<n> (max 100) and ?page=<n> (starting at 1).
+    """
+    term = request.args.get('q', '').strip()
+    if not term:
+        return jsonify({'message': 'Missing search term'}), 400
+    try:
+        limit = parse_limit(request.args.get('limit'), default=20, maximum=100)
+        page = int(request.args.get('page', 1))
+        if page < 1:
+            raise ValueError('page must be positive')
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    results = search_parcels(term, limit + 1, offset=(page - 1) * limit)
+    output = [dict(serialize_parcel(parcel, ADMIN_PARCEL_FIELDS), rank=rank) for parcel, rank in results[:limit]]
+
+    return jsonify({
+        'parcels': output,
+        'page': page,
+        'next_page': page + 1 if len(results) > limit else None,
+    }), 200
+
 @admin_bp.route('/parcels/<int:parcel_id>/status', methods=['PATCH'])
 @admin_required()
 def update_parcel_status(parcel_id):
@@ -63,36 +162,15 @@ def update_parcel_status(parcel_id):
         return jsonify({'message': 'Status is required'}), 400
     
     new_status = data['status']
-    parcel.status = new_status
-    db.session.commit()
+    if not change_status([parcel], new_status):
+        return jsonify({'message': 'Parcel not found'}), 404
 
-    try:
-        user = parcel.user
-        subject = f"Deliveroo Update: Parcel #{parcel.id} Status"
-        html_body = (
-            f"<div style=\"background:#f3f4f6;padding:24px 0;\">"
-            f"<table role=\"presentation\" cellspacing=\"0\" cellpadding=\"0\" border=\"0\" width=\"100%\" style=\"border-collapse:collapse;\">"
-            f"<tr><td align=\"center\">"
-            f"<table role=\"presentation\" cellspacing=\"0\" cellpadding=\"0\" border=\"0\" width=\"560\" style=\"border-collapse:collapse;background:#ffffff;border-radius:12px;overflow:hidden;box-shadow:0 6px 18px rgba(31,41,55,0.08);\">"
-            f"<tr><td style=\"background:#111827;color:#ffffff;padding:18px 24px;font-family:Arial,sans-serif;font-size:18px;font-weight:700;letter-spacing:0.3px;\">Deliveroo</td></tr>"
-            f"<tr><td style=\"padding:24px;font-family:Arial,sans-serif;color:#1f2937;line-height:1.6;\">"
-            f"<p style=\"margin:0 0 12px;font-size:16px;\">Hello {user.username},</p>"
-            f"<p style=\"margin:0 0 12px;font-size:15px;\">Your parcel is on the move. The status for order "
-            f"<strong>#{parcel.id}</strong> is now <span style=\"display:inline-block;background:#e5f5e0;color:#166534;padding:2px 8px;border-radius:999px;font-weight:700;\">{new_status}</span>.</p>"
-            f"<p style=\"margin:0 0 12px;font-size:15px;\">If you have any questions, just reply to this email and our team will help.</p>"
-            f"<p style=\"margin:0;font-size:15px;\">Thanks for choosing Deliveroo.</p>"
-            f"</td></tr>"
-            f"<tr><td style=\"padding:14px 24px;background:#f9fafb;font-family:Arial,sans-serif;color:#6b7280;font-size:12px;text-align:center;\">"
-            f"Fast, reliable parcel delivery."
-            f"</td></tr>"
-            f"</table>"
-            f"</td></tr>"
-            f"</table>"
-            f"</div>"
-        )
-        send_email(user.email, subject, html_body)
-    except Exception as e:
-        print(f"Error sending email notification: {e}")
+    record_event(parcel.id, 'status', new_status)
+    notification_coalescer.add(parcel, 'status', new_status)
+
+    db.session.commit()
+    parcel_broadcaster.notify(parcel.id)
+    outbox_mailer.wake()
 
     return jsonify({'message': f'Parcel {parcel.id} status updated to {new_status}'}), 200
 
@@ -109,37 +187,88 @@ def update_parcel_location(parcel_id):
     
     new_location = data['location']
     parcel.present_location = new_location
+
+    record_event(parcel.id, 'location', new_location)
+    notification_coalescer.add(parcel, 'location', new_location)
+
     db.session.commit()
+    parcel_broadcaster.notify(parcel.id)
+    outbox_mailer.wake()
 
-    try:
-        user = parcel.user
-        subject = f"Deliveroo Update: Parcel #{parcel.id} Location"
-        html_body = (
-            f"<div style=\"background:#f3f4f6;padding:24px 0;\">"
-            f"<table role=\"presentation\" cellspacing=\"0\" cellpadding=\"0\" border=\"0\" width=\"100%\" style=\"border-collapse:collapse;\">"
-            f"<tr><td align=\"center\">"
-            f"<table role=\"presentation\" cellspacing=\"0\" cellpadding=\"0\" border=\"0\" width=\"560\" style=\"border-collapse:collapse;background:#ffffff;border-radius:12px;overflow:hidden;box-shadow:0 6px 18px rgba(31,41,55,0.08);\">"
-            f"<tr><td style=\"background:#111827;color:#ffffff;padding:18px 24px;font-family:Arial,sans-serif;font-size:18px;font-weight:700;letter-spacing:0.3px;\">Deliveroo</td></tr>"
-            f"<tr><td style=\"padding:24px;font-family:Arial,sans-serif;color:#1f2937;line-height:1.6;\">"
-            f"<p style=\"margin:0 0 12px;font-size:16px;\">Hello {user.username},</p>"
-            f"<p style=\"margin:0 0 12px;font-size:15px;\">We have a new location update for parcel "
-            f"<strong>#{parcel.id}</strong>: <strong>{new_location}</strong>.</p>"
-            f"<p style=\"margin:0 0 12px;font-size:15px;\">We are keeping a close eye on your delivery and will share any further changes.</p>"
-            f"<p style=\"margin:0;font-size:15px;\">Thanks for choosing Deliveroo.</p>"
-            f"</td></tr>"
-            f"<tr><td style=\"padding:14px 24px;background:#f9fafb;font-family:Arial,sans-serif;color:#6b7280;font-size:12px;text-align:center;\">"
-            f"Fast, reliable parcel delivery."
-            f"</td></tr>"
-            f"</table>"
-            f"</td></tr>"
-            f"</table>"
-            f"</div>"
+    return jsonify({'message': f'Parcel {parcel.id} location updated to {new_location}'}), 200
+
+@admin_bp.route('/parcels/bulk', methods=['PATCH'])
+@admin_required()
+def bulk_update_parcels():
+    """
+    Sets the status and/or location of many parcels in one transaction.
+    Body: {"ids": [1, 2, ...]} or {"filter": {"status", "present_location", "user_id"}},
+    plus "status" and/or "location". Returns a result per requested ID.
+    """
+    data = request.get_json(silent=True) or {}
+    values = {}
+    if data.get('status'):
+        values['status'] = data['status']
+    if data.get('location'):
+        values['present_location'] = data['location']
+    if not values:
+        return jsonify({'message': 'Status or location is required'}), 400
+
+    limit = current_app.config.get('BULK_UPDATE_MAX', 5000)
+    # A status change also needs what the rollup uses to move these parcels
+    selected = TRANSITION_COLUMNS if 'status' in values else (Parcel.id, Parcel.user_id)
+    query = db.session.query(*selected)
+    ids = data.get('ids')
+    if ids is not None:
+        if not isinstance(ids, list) or not ids or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            return jsonify({'message': 'ids must be a non-empty list of parcel IDs'}), 400
+        if len(ids) > limit:
+            return jsonify({'message': f'At most {limit} parcels per request'}), 400
+        query = query.filter(Parcel.id.in_(set(ids)))
+    else:
+        criteria = data.get('filter') or {}
+        columns = {'status': Parcel.status, 'present_location': Parcel.present_location, 'user_id': Parcel.user_id}
+        if not isinstance(criteria, dict) or not criteria or set(criteria) - set(columns):
+            return jsonify({'message': f"Provide ids or a filter on {', '.join(columns)}"}), 400
+        for name, value in criteria.items():
+            query = query.filter(columns[name] == value)
+        query = query.order_by(Parcel.id).limit(limit + 1)
+
+    targets = query.all()
+    if ids is None and len(targets) > limit:
+        return jsonify({'message': f'Filter matches more than {limit} parcels'}), 400
+    found = [row.id for row in targets]
+
+    if found and 'status' in values:
+        # Parcels deleted since they were read drop out here
+        others = {name: value for name, value in values.items() if name != 'status'}
+        targets = change_status(targets, values['status'], others)
+        found = [row.id for row in targets]
+    elif found:
+        Parcel.query.filter(Parcel.id.in_(found)).update(
+            dict(values, updated_at=db.func.now()), synchronize_session=False,
         )
-        send_email(user.email, subject, html_body)
-    except Exception as e:
-        print(f"Error sending email notification: {e}")
+    if found:
+        if 'status' in values:
+            record_events(found, 'status', values['status'])
+            notification_coalescer.add_many(targets, 'status', values['status'])
+        if 'present_location' in values:
+            record_events(found, 'location', values['present_location'])
+            notification_coalescer.add_many(targets, 'location', values['present_location'])
+    db.session.commit()
 
-    return jsonify({'message': f'Parcel {parcel.id} location updated to {new_location}'}), 200
+    if found:
+        parcel_broadcaster.notify(*found)
+        outbox_mailer.wake()
+
+    updated = set(found)
+    requested = ids if ids is not None else found
+    results = [
+        {'id': parcel_id, 'updated': True} if parcel_id in updated
+        else {'id': parcel_id, 'updated': False, 'message': 'Parcel not found'}
+        for parcel_id in dict.fromkeys(requested)
+    ]
+    return jsonify({'updated': len(found), 'results': results}), 200
 
 @admin_bp.route('/parcels/<int:parcel_id>/proof', methods=['POST'])
 @admin_required()
@@ -155,13 +284,59 @@ def upload_proof_of_delivery(parcel_id):
     if file.filename == '':
         return jsonify({'message': 'No selected file for proof image'}), 400
 
-    filename = secure_filename(file.filename)
-    file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
-    
+    try:
+        filename = upload_store.save(file)
+    except UploadTooLarge as e:
+        return jsonify({'message': str(e)}), 413
+
     parcel.proof_of_delivery_image_url = filename
+    record_event(parcel.id, 'proof', filename)
     db.session.commit()
+    derivatives.schedule(filename)
 
     return jsonify({
         'message': 'Proof of delivery uploaded successfully.',
-        'proof_of_delivery_image_url': f"/uploads/{filename}"
+        'proof_of_delivery_image_url': get_full_image_url(filename),
+        'proof_of_delivery_thumbnail_url': get_thumbnail_url(filename),
+    }), 200
+
+@admin_bp.route('/analytics', methods=['GET'])
+@admin_required()
+def get_parcel_analytics():
+    """
+    Dashboard KPIs from the daily rollup table: parcel counts, total weight,
+    shipping revenue and insured value overall, per status and per day.
+    Accepts ?from= and ?to= (creation dates, inclusive) and ?status=.
+    """
+    try:
+        start = parse_date(request.args.get('from'))
+        end = parse_date(request.args.get('to'))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    summary = rollup_summary(
+        start=start.date() if start else None,
+        end=end.date() if end else None,
+        status=request.args.get('status'),
+    )
+    return jsonify(summary), 200
+
+@admin_bp.route('/cache/stats', methods=['GET'])
+@admin_required()
+def get_cache_stats():
+    """
+    Admin route exposing hit/miss counters for the geocoding and routing caches,
+    plus Geoapify circuit breaker state, call timings, the user flag cache
+    and email outbox throughput.
+    """
+    return jsonify({
+        'geocode': geocode_cache.stats(),
+        'route': route_cache.stats(),
+        'geoapify': geo_client.stats(),
+        'streams': parcel_broadcaster.stats(),
+        'user_flags': user_flags.stats(),
+        'email': outbox_mailer.stats(),
+        'notifications': notification_coalescer.stats(),
+        'uploads': upload_store.stats(),
+        'derivatives': derivatives.stats(),
+        'passwords': password_hasher.stats(),
     }), 200
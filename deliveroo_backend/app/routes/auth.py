@@ -1,10 +1,18 @@
 from flask import Blueprint, request, jsonify
 from app.models.user import User
 from app import db
+from app.utils.passwords import HasherBusy, password_hasher
 from flask_jwt_extended import create_access_token, create_refresh_token
 
 auth_bp = Blueprint('auth', __name__)
 
+@auth_bp.errorhandler(HasherBusy)
+def hasher_busy(e):
+    # A login burst is saturating the hashing pool; ask the client to back off.
+    response = jsonify({'message': 'Too many sign-in attempts right now, please retry shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     """
@@ -37,24 +45,18 @@ def register():
 @auth_bp.route('/login', methods=['POST'])
 def login():
     data = request.get_json()
-    
-    # --- START OF DEBUGGING LINES ---
-    print("--- LOGIN ATTEMPT ---", flush=True)
-    print(f"INCOMING PAYLOAD: {data}", flush=True)
-    # --- END OF DEBUGGING LINES ---
 
     if not data or not data.get('email') or not data.get('password'):
-        print("DEBUG: Payload was missing email or password.", flush=True)
         return jsonify({'message': 'Missing email or password'}), 400
 
     user = User.query.filter_by(email=data.get('email')).first()
-    
-    # --- MORE DEBUGGING ---
-    print(f"DEBUG: User found in database for email '{data.get('email')}': {user}", flush=True)
-    # --- END OF DEBUGGING ---
 
     if user and user.check_password(data.get('password')):
-        print("DEBUG: Password check successful.", flush=True)
+        if password_hasher.needs_rehash(user.password_hash):
+            # BCRYPT_LOG_ROUNDS changed since this hash was made.
+            user.set_password(data.get('password'))
+            db.session.commit()
+            password_hasher.count_rehash()
         additional_claims = {"is_admin": user.is_admin}
         access_token = create_access_token(
             identity=str(user.id), additional_claims=additional_claims
@@ -67,5 +69,4 @@ def login():
             'refresh_token': refresh_token
         }), 200
 
-    print("DEBUG: Password check FAILED or user was not found.", flush=True)
     return jsonify({'message': 'Invalid credentials'}), 401
\ No newline at end of file
@@ -1,15 +1,25 @@
-from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
-import requests
-import os
+from flask import Blueprint, request, jsonify, current_app, Response
 import stripe
-import time
-import json
-from werkzeug.utils import secure_filename
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.models.event import ParcelEvent
 from app.models.parcel import Parcel
-from app.models.user import User
 from app import db
-from app.utils.helpers import send_email, get_full_image_url
+from sqlalchemy import func
+from app.utils.helpers import get_full_image_url, get_thumbnail_url, send_email
+from app.utils.geo_client import geo_client, GeoUnavailable
+from app.utils.broadcaster import (
+    parcel_broadcaster, END, RESYNC, RESYNC_MESSAGE, ParcelWatch, StreamCursor, Subscription, format_watch_event,
+)
+from app.utils.conditional import is_fresh, make_etag, not_modified, with_etag
+from app.utils.events import event_dict, events_after, parse_event_id, record_event
+from app.utils.rollups import change_status, rollup_created
+from app.utils.importer import FORMATS, detect_format, import_parcels
+from app.utils.metrics import track_outbound
+from app.utils.pagination import keyset_page, parse_limit
+from app.utils.principal import current_principal
+from app.utils.derivatives import derivatives
+from app.utils.storage import UploadTooLarge, upload_store
+from app.utils.serializers import USER_PARCEL_FIELDS, parcel_query, select_fields, serialize_parcel, serialize_parcels
 
 parcels_bp = Blueprint('parcels', __name__)
 @parcels_bp.route('/parcels', methods=['POST'])
@@ -28,9 +38,6 @@ def create_parcel():
     if file.filename == '':
         return jsonify({'message': 'No selected file for parcel image'}), 400
 
-    filename = secure_filename(file.filename)
-    file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
-
     data = request.form
     required_fields = [
         'recipient_name', 'pickup_location', 'destination', 'weight', 
@@ -46,6 +53,11 @@ def create_parcel():
     except (ValueError, TypeError):
         return jsonify({'message': 'Weight, insured value, and shipping cost must be valid numbers.'}), 400
 
+    try:
+        filename = upload_store.save(file)
+    except UploadTooLarge as e:
+        return jsonify({'message': str(e)}), 413
+
     new_parcel = Parcel(
         user_id=current_user_id,
         recipient_name=data.get('recipient_name'),
@@ -60,114 +72,143 @@ def create_parcel():
     )
 
     db.session.add(new_parcel)
+    db.session.flush()
+    record_event(new_parcel.id, 'created', new_parcel.status or 'Pending')
+    rollup_created([new_parcel])
     db.session.commit()
+    derivatives.schedule(filename)
 
     return jsonify({'message': 'Parcel order created successfully', 'parcel_id': new_parcel.id}), 201
 
-def get_full_image_url(filename):
-    """Helper to construct the full URL for an image."""
-    if not filename:
-        return None
-   
-   
-    return f"/uploads/{filename}"
+@parcels_bp.route('/parcels/import', methods=['POST'])
+@jwt_required()
+def import_parcel_manifest():
+    """
+    Creates many parcels from a CSV or NDJSON manifest, sent either as the
+    request body (Content-Type text/csv or application/x-ndjson) or as a
+    multipart `manifest` file. Admins may include a user_id column.
+    """
+    principal = current_principal()
+    # Manifests can be far larger than the image upload limit.
+    request.max_content_length = current_app.config.get('IMPORT_MAX_BYTES')
+
+    if request.mimetype == 'multipart/form-data':
+        manifest = request.files.get('manifest')
+        if not manifest:
+            return jsonify({'message': 'Manifest file is required'}), 400
+        stream, fmt = manifest.stream, detect_format(manifest.mimetype, manifest.filename)
+    else:
+        stream, fmt = request.stream, detect_format(request.mimetype)
+    fmt = request.args.get('format', fmt)
+    if fmt not in FORMATS:
+        return jsonify({'message': f"Send the manifest as {' or '.join(FORMATS)}"}), 400
+
+    report = import_parcels(
+        stream, fmt, principal.user_id,
+        batch_size=current_app.config.get('IMPORT_BATCH_SIZE', 1000),
+        allow_user_column=principal.is_admin,
+    )
+    return jsonify(report.as_dict()), 200
 
+@parcels_bp.route('/parcels/<int:parcel_id>/image', methods=['POST'])
+@jwt_required()
+def attach_parcel_image(parcel_id):
+    """Adds or replaces a parcel's image, e.g. for parcels created by an import."""
+    parcel = Parcel.query.get(parcel_id)
+
+    if not parcel:
+        return jsonify({'message': 'Parcel not found'}), 404
+
+    if not current_principal().can_access(parcel.user_id):
+        return jsonify({'message': 'Access forbidden: You do not own this parcel'}), 403
+
+    file = request.files.get('parcel_image')
+    if not file or file.filename == '':
+        return jsonify({'message': 'Parcel image file is required'}), 400
 
-def geocode_location(location, api_key):
-    if not location:
-        return None
-    try:
-        geocode_url = f"https://api.geoapify.com/v1/geocode/search?text={location}&apiKey={api_key}"
-        response = requests.get(geocode_url, timeout=8)
-        response.raise_for_status()
-        data = response.json()
-        coords = data['features'][0]['geometry']['coordinates']
-        return {"lon": coords[0], "lat": coords[1]}
-    except (requests.exceptions.RequestException, KeyError, IndexError):
-        return None
-
-
-def route_details_from_coords(origin, destination, api_key):
-    if not origin or not destination:
-        return None
     try:
-        routing_url = (
-            f"https://api.geoapify.com/v1/routing"
-            f"?waypoints={origin['lat']},{origin['lon']}|{destination['lat']},{destination['lon']}"
-            f"&mode=drive&apiKey={api_key}"
-        )
-        response = requests.get(routing_url, timeout=8)
-        response.raise_for_status()
-        data = response.json()
-        details = data['features'][0]['properties']
-        return {
-            "distance_km": round(details['distance'] / 1000, 2),
-            "eta_minutes": max(1, int(details['time'] / 60)),
-        }
-    except (requests.exceptions.RequestException, KeyError, IndexError):
-        return None
+        filename = upload_store.save(file)
+    except UploadTooLarge as e:
+        return jsonify({'message': str(e)}), 413
 
+    parcel.parcel_image_url = filename
+    record_event(parcel.id, 'image', filename)
+    db.session.commit()
+    derivatives.schedule(filename)
+
+    return jsonify({
+        'parcel_image_url': get_full_image_url(filename),
+        'parcel_image_thumbnail_url': get_thumbnail_url(filename),
+    }), 200
 
 @parcels_bp.route('/parcels', methods=['GET'])
 @jwt_required()
 def get_user_parcels():
+    """
+    Lists the current user's parcels.
+    Accepts ?limit=<n> (max 500) and ?cursor=<next_cursor> for newest-first
+    pages, and ?fields=... to limit the returned fields. Responses carry an
+    ETag; a matching If-None-Match gets 304 without loading any parcels.
+    """
     current_user_id = int(get_jwt_identity())
-    user = User.query.get(current_user_id)
-    parcels = user.parcels
-
-    output = []
-    for parcel in parcels:
-        parcel_data = {
-            'id': parcel.id,
-            'recipient_name': parcel.recipient_name,
-            'pickup_location': parcel.pickup_location,
-            'destination': parcel.destination,
-            'weight': parcel.weight,
-            'status': parcel.status,
-            'present_location': parcel.present_location,
-            'created_at': parcel.created_at.isoformat(),
-            'sender_phone': parcel.sender_phone,
-            'recipient_phone': parcel.recipient_phone,
-            'estimated_cost': parcel.estimated_cost,
-            'shipping_cost': parcel.shipping_cost,
-            'parcel_image_url': get_full_image_url(parcel.parcel_image_url),
-            'proof_of_delivery_image_url': get_full_image_url(parcel.proof_of_delivery_image_url)
-        }
-        output.append(parcel_data)
-
-    return jsonify({'parcels': output}), 200
+    try:
+        fields = select_fields(request.args.get('fields'), USER_PARCEL_FIELDS)
+        paged = 'limit' in request.args or 'cursor' in request.args
+        limit = parse_limit(request.args.get('limit')) if paged else None
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    # updated_at has one-second resolution on some databases; the newest
+    # event ID changes on every write, so two writes in one tick still differ.
+    last_event = db.session.query(func.max(ParcelEvent.id)).join(
+        Parcel, Parcel.id == ParcelEvent.parcel_id
+    ).filter(Parcel.user_id == current_user_id).scalar_subquery()
+    count, last_updated, last_event_id = db.session.query(
+        func.count(Parcel.id), func.max(Parcel.updated_at), last_event
+    ).filter(Parcel.user_id == current_user_id).one()
+    etag = make_etag(current_user_id, count, last_updated, last_event_id)
+    if is_fresh(etag):
+        return not_modified(etag)
+
+    query = parcel_query(Parcel.query.filter_by(user_id=current_user_id), fields)
+    if paged:
+        try:
+            rows, next_cursor = keyset_page(query, limit, request.args.get('cursor'))
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        body = {'parcels': serialize_parcels(rows, fields), 'next_cursor': next_cursor}
+    else:
+        body = {'parcels': serialize_parcels(query.order_by(Parcel.id).all(), fields)}
+
+    return with_etag(jsonify(body), etag), 200
 
 
 @parcels_bp.route('/parcels/<int:parcel_id>', methods=['GET'])
 @jwt_required()
 def get_parcel_details(parcel_id):
-    current_user_id = int(get_jwt_identity())
-    user = User.query.get(current_user_id)
-    parcel = Parcel.query.get(parcel_id)
+    try:
+        fields = select_fields(request.args.get('fields'), USER_PARCEL_FIELDS)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    last_event = db.session.query(func.max(ParcelEvent.id)).filter(
+        ParcelEvent.parcel_id == parcel_id
+    ).scalar_subquery()
+    parcel = parcel_query(Parcel.query.filter_by(id=parcel_id), fields).add_columns(
+        Parcel.updated_at, last_event.label('last_event_id')
+    ).first()
 
     if not parcel:
         return jsonify({'message': 'Parcel not found'}), 404
 
-    if parcel.user_id != current_user_id and not user.is_admin:
+    if not current_principal().can_access(parcel.user_id):
         return jsonify({'message': 'Access forbidden: You do not own this parcel'}), 403
 
-    parcel_data = {
-        'id': parcel.id,
-        'recipient_name': parcel.recipient_name,
-        'pickup_location': parcel.pickup_location,
-        'destination': parcel.destination,
-        'weight': parcel.weight,
-        'status': parcel.status,
-        'present_location': parcel.present_location,
-        'created_at': parcel.created_at.isoformat(),
-        'sender_phone': parcel.sender_phone,
-        'recipient_phone': parcel.recipient_phone,
-        'estimated_cost': parcel.estimated_cost,
-        'shipping_cost': parcel.shipping_cost,
-        'parcel_image_url': get_full_image_url(parcel.parcel_image_url),
-        'proof_of_delivery_image_url': get_full_image_url(parcel.proof_of_delivery_image_url)
-    }
-    return jsonify(parcel_data), 200
+    etag = make_etag(parcel.id, parcel.updated_at, parcel.last_event_id)
+    if is_fresh(etag):
+        return not_modified(etag)
+
+    return with_etag(jsonify(serialize_parcel(parcel, fields)), etag), 200
 
 
 @parcels_bp.route('/parcels/<int:parcel_id>/destination', methods=['PATCH'])
@@ -190,7 +231,9 @@ def change_parcel_destination(parcel_id):
         return jsonify({'message': 'New destination is required'}), 400
     
     parcel.destination = data['destination']
+    record_event(parcel.id, 'destination', parcel.destination)
     db.session.commit()
+    parcel_broadcaster.notify(parcel.id)
 
     return jsonify({'message': 'Parcel destination updated successfully'}), 200
 
@@ -209,11 +252,42 @@ def cancel_parcel_order(parcel_id):
     if parcel.status == 'Delivered':
         return jsonify({'message': 'Cannot cancel a delivered parcel'}), 400
     
-    parcel.status = 'Cancelled'
+    if not change_status([parcel], 'Cancelled', skip=('Delivered',)):
+        # Delivered (or deleted) since it was read
+        return jsonify({'message': 'Cannot cancel a delivered parcel'}), 400
+    record_event(parcel.id, 'status', 'Cancelled')
     db.session.commit()
+    parcel_broadcaster.notify(parcel.id)
 
     return jsonify({'message': 'Parcel order has been cancelled'}), 200
 
+@parcels_bp.route('/parcels/<int:parcel_id>/events', methods=['GET'])
+@jwt_required()
+def get_parcel_events(parcel_id):
+    """
+    A parcel's tracking timeline, oldest first. Pages by event ID: pass the
+    previous page's `next_after` as `?after=` to continue.
+    """
+    owner = db.session.query(Parcel.user_id).filter(Parcel.id == parcel_id).first()
+
+    if not owner:
+        return jsonify({'message': 'Parcel not found'}), 404
+
+    if not current_principal().can_access(owner.user_id):
+        return jsonify({'message': 'Access forbidden'}), 403
+
+    try:
+        limit = parse_limit(request.args.get('limit'), default=100, maximum=500)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    events = events_after(parcel_id, parse_event_id(request.args.get('after')), limit)
+
+    return jsonify({
+        'events': [event_dict(event) for event in events],
+        'next_after': events[-1].id if len(events) == limit else None,
+    }), 200
+
+
 @parcels_bp.route('/parcels/<int:parcel_id>/route', methods=['GET'])
 @jwt_required()
 def get_parcel_route_details(parcel_id):
@@ -221,134 +295,145 @@ def get_parcel_route_details(parcel_id):
     Gets route details (distance, duration) for a parcel from Geoapify.
     Protected route.
     """
-    current_user_id = int(get_jwt_identity())
-    
-    # We need to query the user to check if they are an admin
-    user = User.query.get(current_user_id)
     parcel = Parcel.query.get(parcel_id)
 
     if not parcel:
         return jsonify({'message': 'Parcel not found'}), 404
 
     # Security check: Allow access only if the user owns the parcel OR is an admin
-    if parcel.user_id != current_user_id and not user.is_admin:
+    if not current_principal().can_access(parcel.user_id):
         return jsonify({'message': 'Access forbidden'}), 403
 
-    api_key = current_app.config['GEOAPIFY_API_KEY']
-    
-    # --- Step 1: Geocode Pickup and Destination Locations ---
-    try:
-        # Geocode pickup location
-        geocode_pickup_url = f"https://api.geoapify.com/v1/geocode/search?text={parcel.pickup_location}&apiKey={api_key}"
-        pickup_response = requests.get(geocode_pickup_url)
-        pickup_response.raise_for_status() # Raises an exception for bad status codes (4xx or 5xx)
-        pickup_data = pickup_response.json()
-        pickup_coords = pickup_data['features'][0]['geometry']['coordinates']
-
-        # Geocode destination location
-        geocode_dest_url = f"https://api.geoapify.com/v1/geocode/search?text={parcel.destination}&apiKey={api_key}"
-        dest_response = requests.get(geocode_dest_url)
-        dest_response.raise_for_status()
-        dest_data = dest_response.json()
-        dest_coords = dest_data['features'][0]['geometry']['coordinates']
-
-    except (requests.exceptions.RequestException, IndexError, KeyError) as e:
-        print(f"Error during geocoding: {e}")
-        return jsonify({'message': 'Could not find coordinates for the provided locations. Please check the addresses.'}), 400
-
-    # --- Step 2: Get Route Details ---
     try:
-        # Note: Geoapify uses lon,lat format
-        lon1, lat1 = pickup_coords
-        lon2, lat2 = dest_coords
-        
-        routing_url = f"https://api.geoapify.com/v1/routing?waypoints={lat1},{lon1}|{lat2},{lon2}&mode=drive&apiKey={api_key}"
-        routing_response = requests.get(routing_url)
-        routing_response.raise_for_status()
-        routing_data = routing_response.json()
-        
-        route_details = routing_data['features'][0]['properties']
-        distance_meters = route_details['distance']
-        duration_seconds = route_details['time']
-
-    except (requests.exceptions.RequestException, IndexError, KeyError) as e:
-        print(f"Error during routing: {e}")
+        # --- Step 1: Geocode Pickup and Destination Locations (in parallel) ---
+        pickup_coords, dest_coords = geo_client.geocode_many(parcel.pickup_location, parcel.destination)
+        if not pickup_coords or not dest_coords:
+            return jsonify({'message': 'Could not find coordinates for the provided locations. Please check the addresses.'}), 400
+
+        # --- Step 2: Get Route Details ---
+        route_details = geo_client.route(pickup_coords, dest_coords)
+    except GeoUnavailable as e:
+        current_app.logger.warning("Geo services unavailable: %s", e)
+        return jsonify({'message': 'Route service is temporarily unavailable. Please try again shortly.'}), 503
+
+    if not route_details:
         return jsonify({'message': 'Could not calculate the route between the locations.'}), 500
 
     return jsonify({
-        'distance_km': round(distance_meters / 1000, 2),
-        'duration_minutes': max(1, int(duration_seconds / 60)),
-        'pickup_coordinates': {'lat': lat1, 'lon': lon1},
-        'destination_coordinates': {'lat': lat2, 'lon': lon2},
+        'distance_km': route_details['distance_km'],
+        'duration_minutes': route_details['eta_minutes'],
+        'pickup_coordinates': pickup_coords,
+        'destination_coordinates': dest_coords,
     }), 200
 
 
 @parcels_bp.route('/parcels/<int:parcel_id>/stream', methods=['GET'])
 @jwt_required()
 def stream_parcel_updates(parcel_id):
-    current_user_id = int(get_jwt_identity())
-    user = User.query.get(current_user_id)
     parcel = Parcel.query.get(parcel_id)
 
     if not parcel:
         return jsonify({'message': 'Parcel not found'}), 404
 
-    if parcel.user_id != current_user_id and not user.is_admin:
+    if not current_principal().can_access(parcel.user_id):
         return jsonify({'message': 'Access forbidden'}), 403
 
-    api_key = current_app.config['GEOAPIFY_API_KEY']
-    last_payload = {}
-    last_destination = None
-    destination_coords = None
+    # A reconnecting EventSource sends the ID of the last event it saw; replay
+    # only what it missed, from the (parcel_id, id) index.
+    last_event_id = parse_event_id(request.headers.get('Last-Event-ID') or request.args.get('last_event_id'))
+    cursor = StreamCursor(last_event_id)
+    missed = []
+    if last_event_id is not None:
+        missed = cursor.missed([event_dict(event) for event in events_after(parcel_id, last_event_id)])
+
+    # One shared poller watches the parcel for every open stream; this
+    # generator only relays its events. It deliberately runs outside the
+    # request context so no DB connection is held for the stream's lifetime.
+    subscription = parcel_broadcaster.subscribe(parcel_id)
+    keepalive = parcel_broadcaster.keepalive
 
     def event_stream():
-        nonlocal last_payload, last_destination, destination_coords
-        while True:
-            db.session.expire_all()
-            parcel = Parcel.query.get(parcel_id)
-            if not parcel:
-                yield "event: end\ndata: {}\n\n"
-                break
-
-            payload = {
-                "status": parcel.status,
-                "present_location": parcel.present_location,
-            }
-
-            if api_key and parcel.present_location:
-                current_coords = geocode_location(parcel.present_location, api_key)
-                if current_coords:
-                    payload["current_coordinates"] = current_coords
-
-                if parcel.destination:
-                    if parcel.destination != last_destination:
-                        destination_coords = geocode_location(parcel.destination, api_key)
-                        last_destination = parcel.destination
-                    if destination_coords and current_coords:
-                        route_details = route_details_from_coords(current_coords, destination_coords, api_key)
-                        if route_details:
-                            payload.update(route_details)
-
-            if payload != last_payload:
-                yield f"data: {json.dumps(payload)}\n\n"
-                last_payload = payload
-            else:
-                yield ": keepalive\n\n"
-
-            time.sleep(2)
-
-    response = Response(stream_with_context(event_stream()), mimetype='text/event-stream')
+        try:
+            yield from missed
+            while True:
+                payload = subscription.get(timeout=keepalive)
+                if payload is None:
+                    yield ": keepalive\n\n"
+                elif payload is END:
+                    yield "event: end\ndata: {}\n\n"
+                    break
+                elif payload is RESYNC:
+                    yield RESYNC_MESSAGE
+                    break
+                else:
+                    message = cursor.render(payload)
+                    if message:
+                        yield message
+        finally:
+            parcel_broadcaster.unsubscribe(subscription)
+
+    response = Response(event_stream(), mimetype='text/event-stream')
     response.headers['Cache-Control'] = 'no-cache'
     response.headers['X-Accel-Buffering'] = 'no'
     return response
 
-    return jsonify({
-        'message': 'Route details retrieved successfully',
-        'pickup_coordinates': {'lon': lon1, 'lat': lat1},
-        'destination_coordinates': {'lon': lon2, 'lat': lat2},
-        'distance_km': round(distance_meters / 1000, 2),
-        'duration_minutes': round(duration_seconds / 60)
-    }), 200
+@parcels_bp.route('/parcels/watch', methods=['GET'])
+@jwt_required()
+def watch_parcels():
+    """
+    One tracking stream for many parcels.
+    Accepts ?ids=1,2,3 and/or ?status=<status>. Admins may watch any parcel;
+    other users only ever see their own. The first event is a `snapshot` of
+    every matching parcel, followed by batches of compact deltas.
+    """
+    principal = current_principal()
+
+    try:
+        watch = parse_watch_request(request.args, principal.user_id, principal.is_admin)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    subscription = parcel_broadcaster.watch(watch, Subscription(None, maxsize=256))
+    keepalive = parcel_broadcaster.keepalive
+
+    def event_stream():
+        try:
+            while True:
+                event = subscription.get(timeout=keepalive)
+                if event is None:
+                    yield ": keepalive\n\n"
+                elif event is RESYNC:
+                    yield RESYNC_MESSAGE
+                    break
+                else:
+                    yield format_watch_event(event)
+        finally:
+            parcel_broadcaster.unsubscribe(subscription)
+
+    response = Response(event_stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def parse_watch_request(args, user_id, is_admin):
+    """Builds a ParcelWatch from ?ids= and ?status=. Raises ValueError on bad input."""
+    ids = None
+    if args.get('ids'):
+        try:
+            ids = [int(value) for value in args['ids'].split(',') if value.strip()]
+        except ValueError:
+            raise ValueError('ids must be a comma-separated list of parcel IDs')
+        if len(ids) > current_app.config.get('PARCEL_WATCH_MAX_IDS', 1000):
+            raise ValueError('Too many parcel IDs to watch at once')
+    status_filter = args.get('status')
+
+    if is_admin:
+        if not ids and not status_filter:
+            raise ValueError('Provide ids and/or status to watch')
+        return ParcelWatch(ids=ids, status=status_filter)
+    return ParcelWatch(ids=ids, status=status_filter, user_id=user_id)
+
 
 @parcels_bp.route('/contact', methods=['POST'])
 def handle_contact_form():
@@ -395,29 +480,19 @@ def get_shipping_quote():
     except (ValueError, TypeError):
         return jsonify({'message': 'Weight must be a valid number'}), 400
 
-    api_key = current_app.config['GEOAPIFY_API_KEY']
-    
     try:
-        pickup_loc = data['pickup_location']
-        dest_loc = data['destination']
-        geocode_pickup_url = f"https://api.geoapify.com/v1/geocode/search?text={pickup_loc}&apiKey={api_key}"
-        pickup_response = requests.get(geocode_pickup_url).json()
-        pickup_coords = pickup_response['features'][0]['geometry']['coordinates']
-
-        geocode_dest_url = f"https://api.geoapify.com/v1/geocode/search?text={dest_loc}&apiKey={api_key}"
-        dest_response = requests.get(geocode_dest_url).json()
-        dest_coords = dest_response['features'][0]['geometry']['coordinates']
-    except (requests.exceptions.RequestException, IndexError, KeyError):
-        return jsonify({'message': 'Could not calculate route. Please check addresses.'}), 400
+        pickup_coords, dest_coords = geo_client.geocode_many(data['pickup_location'], data['destination'])
+        if not pickup_coords or not dest_coords:
+            return jsonify({'message': 'Could not calculate route. Please check addresses.'}), 400
 
-    try:
-        lon1, lat1 = pickup_coords
-        lon2, lat2 = dest_coords
-        routing_url = f"https://api.geoapify.com/v1/routing?waypoints={lat1},{lon1}|{lat2},{lon2}&mode=drive&apiKey={api_key}"
-        routing_data = requests.get(routing_url).json()
-        distance_km = routing_data['features'][0]['properties']['distance'] / 1000
-    except (requests.exceptions.RequestException, IndexError, KeyError):
+        route_details = geo_client.route(pickup_coords, dest_coords)
+    except GeoUnavailable as e:
+        current_app.logger.warning("Geo services unavailable: %s", e)
+        return jsonify({'message': 'Quotes are temporarily unavailable. Please try again shortly.'}), 503
+
+    if not route_details:
         return jsonify({'message': 'Could not calculate distance between the locations.'}), 500
+    distance_km = route_details['distance_km']
 
     BASE_FEE = 5.0
     PRICE_PER_KM = 0.75
@@ -444,18 +519,21 @@ def create_payment():
         
         # Set your secret key
         stripe.api_key = current_app.config['STRIPE_SECRET_KEY']
+        if current_app.config.get('STRIPE_API_BASE'):
+            stripe.api_base = current_app.config['STRIPE_API_BASE']
 
         # Create a PaymentIntent with the order amount and currency
         # The amount is in the smallest currency unit (e.g., cents for USD)
         amount_in_cents = int(float(data['cost']) * 100)
 
-        intent = stripe.PaymentIntent.create(
-            amount=amount_in_cents,
-            currency='usd', # Change this to your desired currency
-            automatic_payment_methods={
-                'enabled': True,
-            },
-        )
+        with track_outbound('stripe'):
+            intent = stripe.PaymentIntent.create(
+                amount=amount_in_cents,
+                currency='usd', # Change this to your desired currency
+                automatic_payment_methods={
+                    'enabled': True,
+                },
+            )
         
         return jsonify({
             'clientSecret': intent.client_secret
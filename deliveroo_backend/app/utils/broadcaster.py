@@ -0,0 +1,452 @@
+import asyncio
+import json
+import queue
+import threading
+import time
+
+from sqlalchemy import func
+
+from app import db
+from app.models.event import ParcelEvent
+from app.models.parcel import Parcel
+from app.utils.geo_client import geo_client, GeoUnavailable
+
+END = object()  # Delivered to subscribers when their parcel disappears
+RESYNC = object()  # Replaces the backlog of a subscriber that fell too far behind
+# Sent before closing an overflowed stream. EventSource reconnects on its own:
+# tracking streams resume from Last-Event-ID, watch streams get a new snapshot.
+RESYNC_MESSAGE = "event: resync\ndata: {}\n\n"
+TRACKED_FIELDS = ('status', 'present_location', 'destination')
+# Event IDs are allocated before commit, so a slow transaction can commit an
+# older ID after a newer one was already seen. Each tick re-reads this many
+# IDs behind the watermark; the snapshot check drops the repeats.
+EVENT_LOOKBACK = 200
+
+
+class Subscription:
+    """
+    A stream's mailbox. Nothing is dropped quietly: once a slow reader's
+    mailbox is full its backlog is replaced by RESYNC, and the stream closes
+    with RESYNC_MESSAGE so the client reconnects and catches up.
+    """
+
+    def __init__(self, parcel_id, maxsize=16):
+        self.parcel_id = parcel_id
+        self.overflowed = False
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+
+    def deliver(self, event):
+        with self._lock:
+            if self.overflowed:
+                return
+            try:
+                self._queue.put_nowait(event)
+            except queue.Full:
+                self.overflowed = True
+                try:
+                    while True:
+                        self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+                self._queue.put_nowait(RESYNC)
+
+    def get(self, timeout=None):
+        """Returns the next event, or None if nothing arrived within `timeout` seconds."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class AsyncSubscription(Subscription):
+    """
+    Mailbox for a stream served from an asyncio event loop (see app/asgi.py).
+    Events are handed over to the loop thread-safely; `get` is a coroutine.
+    """
+
+    CLOSED = object()  # Put by the server when the client goes away
+
+    def __init__(self, parcel_id, loop, maxsize=16):
+        self.parcel_id = parcel_id
+        self.overflowed = False
+        self.loop = loop
+        self._queue = asyncio.Queue(maxsize=maxsize)
+
+    def deliver(self, event):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def close(self):
+        self._put(self.CLOSED)
+
+    def _put(self, event):
+        if self.overflowed and event is not self.CLOSED:
+            return
+        if self._queue.full():
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            if event is not self.CLOSED:
+                self.overflowed = True
+                event = RESYNC
+        self._queue.put_nowait(event)
+
+    async def get(self, timeout=None):
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class ParcelWatch:
+    """
+    What a multiplexed watch stream is interested in: explicit parcel IDs, a
+    status, and/or one user's parcels. `members` holds the IDs the client
+    currently knows about, so parcels leaving the filter can be reported.
+    """
+
+    def __init__(self, ids=None, status=None, user_id=None):
+        self.ids = set(ids) if ids else None
+        self.status = status
+        self.user_id = user_id
+        self.members = set()
+        self.needs_snapshot = True
+
+    def matches(self, row):
+        return (
+            (self.ids is None or row.id in self.ids)
+            and (self.status is None or row.status == self.status)
+            and (self.user_id is None or row.user_id == self.user_id)
+        )
+
+    def filter(self, query):
+        if self.ids is not None:
+            query = query.filter(Parcel.id.in_(list(self.ids)))
+        if self.status is not None:
+            query = query.filter(Parcel.status == self.status)
+        if self.user_id is not None:
+            query = query.filter(Parcel.user_id == self.user_id)
+        return query
+
+    def delta(self, row, previous):
+        """Returns the compact event for a changed row, or None if the client does not care."""
+        if self.matches(row):
+            if row.id in self.members and previous is not None:
+                changed = {
+                    field: getattr(row, field)
+                    for field, old in zip(TRACKED_FIELDS, previous)
+                    if getattr(row, field) != old
+                }
+                return dict(id=row.id, **changed)
+            self.members.add(row.id)
+            return _row_dict(row)
+        if row.id in self.members:
+            self.members.discard(row.id)
+            return {'id': row.id, 'removed': True}
+        return None
+
+
+class StreamCursor:
+    """
+    Renders one tracking stream's payloads as SSE messages tagged with the
+    parcel's latest event ID. A client reconnecting with Last-Event-ID first
+    gets the events it missed; the current state is then only re-sent if
+    something actually happened since its last event.
+    """
+
+    def __init__(self, last_event_id=None):
+        self.last_event_id = last_event_id
+        self._first = True
+
+    def missed(self, events):
+        """
+        SSE messages for events the client missed while disconnected, oldest
+        first. The cursor moves past them, so the cached state that follows
+        is skipped unless it is newer than the last replayed event.
+        """
+        if events:
+            self.last_event_id = max(self.last_event_id or 0, max(event['id'] for event in events))
+        return [f"id: {event['id']}\nevent: parcel_event\ndata: {json.dumps(event)}\n\n" for event in events]
+
+    def render(self, payload):
+        """Returns the SSE message for a broadcaster payload, or None to skip it."""
+        event_id = payload.get('event_id')
+        if self._first:
+            # The first payload is the broadcaster's cached latest state.
+            self._first = False
+            if event_id is not None and self.last_event_id is not None and event_id <= self.last_event_id:
+                return None
+        if event_id is None:
+            return f"data: {json.dumps(payload)}\n\n"
+        return f"id: {event_id}\ndata: {json.dumps(payload)}\n\n"
+
+
+def format_watch_event(event):
+    """Renders a ('snapshot' | 'delta', items) watch event as an SSE message."""
+    kind, items = event
+    prefix = "event: snapshot\n" if kind == 'snapshot' else ""
+    return f"{prefix}data: {json.dumps(items)}\n\n"
+
+
+def _row_dict(row):
+    return dict(id=row.id, **{field: getattr(row, field) for field in TRACKED_FIELDS})
+
+
+class ParcelBroadcaster:
+    """
+    Watches every parcel that has an open tracking stream from one background
+    thread. Each tick reads the new rows of the parcel_events log, runs a
+    single batched query for the watched parcels that changed (or that a
+    write handler passed to `notify`), enriches each change with coordinates
+    and route details once, and fans the resulting payload out to all of that
+    parcel's subscribers.
+
+    The same tick also serves multiplexed watch streams (`watch`): changed
+    rows are matched against each watcher's filter and every watcher gets one
+    batch of compact deltas per tick, without geo enrichment.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.interval = 2
+        self.keepalive = 15
+        self.resync_every = 15
+        self.snapshot_limit = 1000
+        self._subscribers = {}
+        self._watchers = {}
+        self._latest = {}
+        self._snapshots = {}
+        self._pending = set()
+        self._watermark = None
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._ticks = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.interval = app.config.get('PARCEL_STREAM_INTERVAL', self.interval)
+        self.keepalive = app.config.get('PARCEL_STREAM_KEEPALIVE', self.keepalive)
+        self.resync_every = app.config.get('PARCEL_STREAM_RESYNC_TICKS', self.resync_every)
+        self.snapshot_limit = app.config.get('PARCEL_WATCH_SNAPSHOT_LIMIT', self.snapshot_limit)
+        app.extensions['parcel_broadcaster'] = self
+
+    def subscribe(self, parcel_id, subscription=None):
+        if subscription is None:
+            subscription = Subscription(parcel_id)
+        with self._lock:
+            self._subscribers.setdefault(parcel_id, set()).add(subscription)
+            latest = self._latest.get(parcel_id)
+            if latest is None:
+                self._pending.add(parcel_id)
+        if latest is not None:
+            subscription.deliver(latest)
+        self._ensure_started()
+        self._wakeup.set()
+        return subscription
+
+    def watch(self, watch, subscription):
+        """
+        Registers a multiplexed stream. Its first event is ('snapshot', rows)
+        for everything matching the filter, followed by ('delta', events)
+        batches produced by the broadcaster thread.
+        """
+        with self._lock:
+            self._watchers[subscription] = watch
+        self._ensure_started()
+        self._wakeup.set()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if self._watchers.pop(subscription, None) is not None:
+                return
+            subscribers = self._subscribers.get(subscription.parcel_id)
+            if subscribers is None:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.parcel_id]
+                self._latest.pop(subscription.parcel_id, None)
+                self._snapshots.pop(subscription.parcel_id, None)
+
+    def notify(self, *parcel_ids):
+        """Called after a parcel write is committed so watchers see it without waiting a full tick."""
+        with self._lock:
+            watched = [parcel_id for parcel_id in parcel_ids if parcel_id in self._subscribers]
+            self._pending.update(watched)
+        if watched or self._watchers:
+            self._wakeup.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'watched_parcels': len(self._subscribers),
+                'subscribers': sum(len(subscribers) for subscribers in self._subscribers.values()),
+                'watch_streams': len(self._watchers),
+                'ticks': self._ticks,
+            }
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='parcel-broadcaster', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                with self.app.app_context():
+                    self._poll()
+                    db.session.remove()
+            except Exception as e:
+                print(f"Parcel broadcaster tick failed: {e}")
+                time.sleep(self.interval)
+
+    def _poll(self):
+        with self._lock:
+            watched = set(self._subscribers)
+            watchers = list(self._watchers.items())
+            pending = self._pending
+            self._pending = set()
+        self._ticks += 1
+        if not watched and not watchers:
+            return
+
+        # parcel_events is the change feed: {parcel_id: newest event id}.
+        latest_events = self._new_events()
+        changed = set(latest_events)
+        # Periodic full resyncs catch changes written without an event (e.g.
+        # by hand in the database) and parcels that were deleted.
+        full_resync = self._ticks % self.resync_every == 0
+
+        wanted = (changed | pending) & watched
+        if full_resync:
+            wanted |= watched
+        established = [(subscription, watch) for subscription, watch in watchers if not watch.needs_snapshot]
+        if established:
+            if all(watch.ids is not None for _, watch in established):
+                wanted |= changed & set().union(*(watch.ids for _, watch in established))
+            else:
+                wanted |= changed
+
+        rows = []
+        if wanted:
+            rows = db.session.query(
+                Parcel.id, Parcel.user_id, Parcel.status, Parcel.present_location, Parcel.destination,
+            ).filter(Parcel.id.in_(list(wanted))).all()
+
+        found = set()
+        deltas = {}
+        unknown_events = [row.id for row in rows if row.id in watched and row.id not in latest_events]
+        if unknown_events:
+            latest_events.update(self._latest_event_ids(unknown_events))
+        for row in rows:
+            found.add(row.id)
+            snapshot = tuple(getattr(row, field) for field in TRACKED_FIELDS)
+            previous = self._snapshots.get(row.id)
+            if previous == snapshot and row.id not in pending:
+                continue
+            self._snapshots[row.id] = snapshot
+            if row.id in watched:
+                self._publish(row.id, self._build_payload(row, latest_events.get(row.id)))
+            if previous != snapshot:
+                for subscription, watch in established:
+                    event = watch.delta(row, previous)
+                    if event:
+                        deltas.setdefault(subscription, []).append(event)
+
+        for subscription, events in deltas.items():
+            subscription.deliver(('delta', events))
+
+        if watched:
+            for parcel_id in (watched if full_resync else pending & watched) - found:
+                self._publish(parcel_id, END)
+
+        for subscription, watch in watchers:
+            if watch.needs_snapshot:
+                self._send_snapshot(subscription, watch)
+
+        # Only remember rows someone is still looking at. Under the lock:
+        # unsubscribe() pops from the same dict on request threads.
+        keep = set(watched).union(*(watch.members for _, watch in watchers))
+        with self._lock:
+            for parcel_id in [parcel_id for parcel_id in self._snapshots if parcel_id not in keep]:
+                self._snapshots.pop(parcel_id, None)
+
+    def _new_events(self):
+        if self._watermark is None:
+            self._watermark = db.session.query(func.max(ParcelEvent.id)).scalar() or 0
+            return {}
+        rows = db.session.query(ParcelEvent.parcel_id, func.max(ParcelEvent.id)).filter(
+            ParcelEvent.id > self._watermark - EVENT_LOOKBACK
+        ).group_by(ParcelEvent.parcel_id).all()
+        latest = dict(rows)
+        if latest:
+            self._watermark = max(self._watermark, max(latest.values()))
+        return latest
+
+    def _latest_event_ids(self, parcel_ids):
+        return dict(
+            db.session.query(ParcelEvent.parcel_id, func.max(ParcelEvent.id))
+            .filter(ParcelEvent.parcel_id.in_(parcel_ids))
+            .group_by(ParcelEvent.parcel_id).all()
+        )
+
+    def _send_snapshot(self, subscription, watch):
+        # Runs on the broadcaster thread after the tick's deltas, so the
+        # snapshot is never older than a delta the client has already seen.
+        query = db.session.query(
+            Parcel.id, Parcel.status, Parcel.present_location, Parcel.destination,
+        )
+        rows = watch.filter(query).order_by(Parcel.id).limit(self.snapshot_limit).all()
+        for row in rows:
+            self._snapshots[row.id] = tuple(getattr(row, field) for field in TRACKED_FIELDS)
+        watch.members = {row.id for row in rows}
+        watch.needs_snapshot = False
+        subscription.deliver(('snapshot', [_row_dict(row) for row in rows]))
+
+    def _build_payload(self, row, event_id=None):
+        payload = {
+            "status": row.status,
+            "present_location": row.present_location,
+        }
+        if event_id is not None:
+            payload["event_id"] = event_id
+        if not self.app.config.get('GEOAPIFY_API_KEY') or not row.present_location:
+            return payload
+
+        geo_client.start_budget()
+        try:
+            current_coords = geo_client.geocode(row.present_location)
+            if current_coords:
+                payload["current_coordinates"] = current_coords
+            destination_coords = geo_client.geocode(row.destination)
+            route_details = geo_client.route(current_coords, destination_coords)
+            if route_details:
+                payload.update(route_details)
+        except GeoUnavailable:
+            pass  # Send status/location without coordinates until Geoapify recovers
+        return payload
+
+    def _publish(self, parcel_id, payload):
+        with self._lock:
+            subscribers = list(self._subscribers.get(parcel_id, ()))
+            if not subscribers:
+                return
+            if payload is END:
+                self._latest.pop(parcel_id, None)
+                self._snapshots.pop(parcel_id, None)
+            elif self._latest.get(parcel_id) == payload:
+                return
+            else:
+                self._latest[parcel_id] = payload
+        for subscription in subscribers:
+            subscription.deliver(payload)
+
+
+parcel_broadcaster = ParcelBroadcaster()
@@ -0,0 +1,31 @@
+"""
+Conditional GET helpers. Routes compute a cheap validator first (e.g. count
+and max(updated_at) of the rows they would return) and answer 304 Not
+Modified before loading anything when the client's copy is current.
+"""
+import hashlib
+
+from flask import current_app, request
+
+CACHE_CONTROL = 'private, no-cache'  # Always revalidate; never share between users
+
+
+def make_etag(*parts):
+    """Hashes the given validator parts (and the query string, which selects the representation)."""
+    raw = '|'.join(str(part) for part in parts) + '|' + request.query_string.decode('latin-1')
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def is_fresh(etag):
+    return request.if_none_match.contains_weak(etag)
+
+
+def not_modified(etag):
+    response = current_app.response_class(status=304)
+    return with_etag(response, etag)
+
+
+def with_etag(response, etag):
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    return response
@@ -1,15 +1,13 @@
 from functools import wraps
-from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
-from app.models.user import User
+from flask_jwt_extended import verify_jwt_in_request
+from app.utils.principal import current_principal
 
 def admin_required():
     def wrapper(fn):
         @wraps(fn)
         def decorator(*args, **kwargs):
             verify_jwt_in_request()
-            user_id = get_jwt_identity()
-            user = User.query.get(user_id)
-            if user and user.is_admin:
+            if current_principal().is_admin:
                 return fn(*args, **kwargs)
             else:
                 return {'message': 'Admins only!'}, 403
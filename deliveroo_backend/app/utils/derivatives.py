@@ -0,0 +1,172 @@
+"""
+Resized variants of uploaded images.
+
+After an upload is stored, `derivatives.schedule` renders each variant on a
+small process pool so the request never pays for decoding a phone photo.
+The `/uploads/derived/<variant>/<name>` route serves a variant if it
+exists and renders it on first request if it does not (e.g. for images
+uploaded before this pipeline, or while the pool is still busy). Without
+Pillow installed nothing is rendered and that route redirects, uncached,
+to the original.
+"""
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import safe_join
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Optional; variants fall back to the original image
+    Image = None
+
+DERIVED_DIR = 'derived'
+# Variant -> (longest side in pixels, JPEG quality)
+VARIANTS = {
+    'thumb': (320, 70),
+    'web': (1280, 82),
+}
+
+
+def render_variant(source, target, size, quality):
+    """
+    Writes a JPEG of `source` scaled to fit in `size` x `size`. Runs in the
+    pool's worker processes, so it only touches the filesystem.
+    """
+    with Image.open(source) as image:
+        # Lets the JPEG decoder skip straight to a reduced scale; a 12 MP photo
+        # decodes at 1/8 size instead of in full.
+        image.draft('RGB', (size, size))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                image.save(out, 'JPEG', quality=quality, optimize=True, progressive=True)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, target)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    return target
+
+
+class DerivativePipeline:
+    """Renders image variants on a process pool and tracks the ones in flight."""
+
+    def __init__(self, app=None):
+        self.root = None
+        self.workers = 2
+        self.lazy_timeout = 10
+        self._pool = None
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._counters = {'scheduled': 0, 'rendered': 0, 'lazy': 0, 'failed': 0, 'fallbacks': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.root = app.config['UPLOAD_FOLDER']
+        self.workers = app.config.get('DERIVATIVE_WORKERS', self.workers)
+        self.lazy_timeout = app.config.get('DERIVATIVE_LAZY_TIMEOUT', self.lazy_timeout)
+        app.extensions['derivatives'] = self
+
+    @property
+    def enabled(self):
+        return Image is not None and self.workers > 0
+
+    def path_for(self, variant, name):
+        """Where the variant of upload `name` lives, relative to the upload folder."""
+        stem = os.path.splitext(name)[0]
+        return f'{DERIVED_DIR}/{variant}/{stem}.jpg'
+
+    def schedule(self, name):
+        """Queues every missing variant of a freshly stored upload. Returns immediately."""
+        if not self.enabled or not name:
+            return
+        for variant in VARIANTS:
+            self._submit(variant, name)
+
+    def ensure(self, variant, name):
+        """
+        Returns the variant's path relative to the upload folder, rendering it
+        first if needed, or None when it cannot be produced (the caller then
+        redirects to the original).
+        """
+        source = safe_join(self.root, name)
+        if source is None:
+            return None
+        relative = self.path_for(variant, name)
+        if os.path.exists(os.path.join(self.root, relative)):
+            return relative
+        if not self.enabled or not os.path.isfile(source):
+            self._count('fallbacks')
+            return None
+        try:
+            self._submit(variant, name, lazy=True).result(timeout=self.lazy_timeout)
+        except Exception:  # Still rendering, or not an image Pillow can read
+            self._count('fallbacks')
+            return None
+        return relative
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            counters['in_flight'] = len(self._pending)
+        counters['enabled'] = self.enabled
+        return counters
+
+    def _submit(self, variant, name, lazy=False):
+        key = (variant, name)
+        with self._lock:
+            future = self._pending.get(key)
+            if future is not None:
+                return future
+            size, quality = VARIANTS[variant]
+            args = (
+                os.path.join(self.root, name),
+                os.path.join(self.root, self.path_for(variant, name)),
+                size, quality,
+            )
+            try:
+                future = self._get_pool().submit(render_variant, *args)
+            except BrokenProcessPool:
+                # A worker died (e.g. killed while decoding a huge image); start a fresh pool.
+                self._pool = None
+                future = self._get_pool().submit(render_variant, *args)
+            self._pending[key] = future
+            self._counters['lazy' if lazy else 'scheduled'] += 1
+        future.add_done_callback(lambda done: self._finished(key, done))
+        return future
+
+    def _get_pool(self):
+        if self._pool is None:
+            # Spawned rather than forked: forking a threaded server can copy
+            # held locks into the child.
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+            )
+        return self._pool
+
+    def _finished(self, key, future):
+        with self._lock:
+            self._pending.pop(key, None)
+        error = future.exception()
+        if error is not None:
+            print(f"Could not render {key[0]} variant of {key[1]}: {error}")
+            self._count('failed')
+        else:
+            self._count('rendered')
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+
+derivatives = DerivativePipeline()
@@ -0,0 +1,48 @@
+"""
+Append-only parcel history. Every parcel write (status, location,
+destination, images) records a ParcelEvent in the same transaction; the
+broadcaster follows the table as its change feed and tracking streams use
+event IDs to resume where a client left off.
+"""
+from app import db
+from app.models.event import ParcelEvent
+
+
+def record_event(parcel_id, kind, value):
+    """Adds one event to the current transaction. The caller commits."""
+    db.session.add(ParcelEvent(parcel_id=parcel_id, kind=kind, value=value))
+
+
+def record_events(parcel_ids, kind, value):
+    """Records the same change for many parcels with one multi-row INSERT."""
+    if parcel_ids:
+        db.session.execute(ParcelEvent.__table__.insert(), [
+            {'parcel_id': parcel_id, 'kind': kind, 'value': value} for parcel_id in parcel_ids
+        ])
+
+
+def events_after(parcel_id, after_id=None, limit=500):
+    """A parcel's events with IDs above `after_id`, oldest first, read from the (parcel_id, id) index."""
+    query = db.session.query(
+        ParcelEvent.id, ParcelEvent.kind, ParcelEvent.value, ParcelEvent.created_at,
+    ).filter(ParcelEvent.parcel_id == parcel_id)
+    if after_id is not None:
+        query = query.filter(ParcelEvent.id > after_id)
+    return query.order_by(ParcelEvent.id).limit(limit).all()
+
+
+def event_dict(event):
+    return {
+        'id': event.id,
+        'kind': event.kind,
+        'value': event.value,
+        'created_at': event.created_at.isoformat() if event.created_at else None,
+    }
+
+
+def parse_event_id(value):
+    """Parses a Last-Event-ID / ?after= value. Returns None when absent or malformed."""
+    try:
+        return int(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
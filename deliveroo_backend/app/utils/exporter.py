@@ -0,0 +1,191 @@
+"""
+Streaming parcel export to CSV, NDJSON or Parquet.
+
+Rows are read through a server-side cursor (`stream_results`; a named
+cursor on Postgres) EXPORT_CHUNK_ROWS at a time, encoded, optionally
+gzip-compressed, and handed on as byte chunks, so memory stays at about
+one chunk however many parcels are exported. Parquet needs pyarrow (in
+requirements.txt; without it format=parquet answers 501); it is compressed
+internally (zstd) instead of gzipped.
+
+Used by GET /admin/parcels/export and `flask parcels export`.
+"""
+import csv
+import io
+import zlib
+from datetime import date, datetime, time, timedelta
+
+from flask import current_app
+
+from app.models.parcel import Parcel
+from app.utils.serializers import ADMIN_PARCEL_FIELDS, PARCEL_FIELDS, parcel_query, serialize_parcels
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Optional; only needed for format=parquet
+    pyarrow = None
+
+EXPORT_FORMATS = ('csv', 'ndjson', 'parquet')
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+class ExportUnavailable(Exception):
+    """The requested format needs an optional dependency that is not installed."""
+
+
+def parse_date(value, end=False):
+    """
+    Parses an ISO date or datetime filter bound. A bare date used as the
+    end of a range covers that whole day. Raises ValueError.
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid date '{value}', expected YYYY-MM-DD or an ISO datetime")
+    if end and len(value) == 10:
+        return datetime.combine(parsed.date() + timedelta(days=1), time.min)
+    return parsed
+
+
+def export_query(fields=ADMIN_PARCEL_FIELDS, status=None, user_id=None, start=None, end=None):
+    """The filtered, projected query an export streams, in ID order. `end` is exclusive."""
+    query = Parcel.query
+    if status:
+        query = query.filter(Parcel.status == status)
+    if user_id is not None:
+        query = query.filter(Parcel.user_id == user_id)
+    if start is not None:
+        query = query.filter(Parcel.created_at >= start)
+    if end is not None:
+        query = query.filter(Parcel.created_at < end)
+    return parcel_query(query, fields).order_by(Parcel.id)
+
+
+def export_filename(fmt, compress):
+    return f"parcels-{date.today().isoformat()}.{fmt}{'.gz' if compress and fmt != 'parquet' else ''}"
+
+
+def stream_export(query, fields, fmt, compress=True, chunk_rows=None):
+    """
+    Returns an iterator over the encoded export's byte chunks. Raises
+    ExportUnavailable up front rather than partway through a response.
+    """
+    if fmt == 'parquet' and pyarrow is None:
+        raise ExportUnavailable('Parquet export needs pyarrow, which is not installed')
+    return _encode(query, fields, fmt, compress, chunk_rows or current_app.config.get('EXPORT_CHUNK_ROWS', 5000))
+
+
+def _encode(query, fields, fmt, compress, chunk_rows):
+    rows = query.execution_options(stream_results=True, yield_per=chunk_rows)
+    chunks = _chunks(rows, chunk_rows)
+
+    if fmt == 'parquet':
+        yield from _parquet(chunks, fields)
+        return
+
+    encode = _csv if fmt == 'csv' else _ndjson
+    if not compress:
+        yield from encode(chunks, fields)
+        return
+    gzip = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for data in encode(chunks, fields):
+        compressed = gzip.compress(data)
+        if compressed:
+            yield compressed
+    yield gzip.flush()
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _csv(chunks, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for chunk in chunks:
+        for parcel in serialize_parcels(chunk, fields):
+            writer.writerow(parcel.values())
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _ndjson(chunks, fields):
+    dumps = current_app.json.dumps
+    for chunk in chunks:
+        yield ''.join(dumps(parcel) + '\n' for parcel in serialize_parcels(chunk, fields)).encode('utf-8')
+
+
+class _Sink(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last `drain`."""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def _arrow_schema(fields):
+    types = {int: pyarrow.int64(), float: pyarrow.float64(), bool: pyarrow.bool_(), datetime: pyarrow.timestamp('us')}
+    schema = []
+    for name in fields:
+        column, transform = PARCEL_FIELDS[name]
+        if transform is not None and name != 'created_at':
+            schema.append((name, pyarrow.string()))  # URLs built from filenames
+        else:
+            schema.append((name, types.get(column.type.python_type, pyarrow.string())))
+    return pyarrow.schema(schema)
+
+
+def _parquet(chunks, fields):
+    # Keep timestamps typed in Parquet; every other field matches the JSON output.
+    plan = [
+        (name, PARCEL_FIELDS[name][0].key, None if name == 'created_at' else PARCEL_FIELDS[name][1])
+        for name in fields
+    ]
+    schema = _arrow_schema(fields)
+    sink = _Sink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression='zstd')
+    for chunk in chunks:
+        columns = {
+            name: [transform(getattr(row, key)) if transform else getattr(row, key) for row in chunk]
+            for name, key, transform in plan
+        }
+        writer.write_batch(pyarrow.RecordBatch.from_pydict(columns, schema=schema))  # One row group per chunk
+        data = sink.drain()
+        if data:
+            yield data
+    writer.close()
+    yield sink.drain()
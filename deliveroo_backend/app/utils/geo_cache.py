@@ -0,0 +1,263 @@
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.geocode import GeocodeCacheEntry
+
+_MISSING = object()
+_PUNCTUATION = re.compile(r'[^\w\s]')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_address(address):
+    """Folds case, punctuation and whitespace so equivalent addresses share one key."""
+    if not address:
+        return ''
+    text = unicodedata.normalize('NFKC', str(address)).casefold()
+    text = _PUNCTUATION.sub(' ', text)
+    text = _WHITESPACE.sub(' ', text).strip()
+    if len(text) > 255:
+        # Keys must fit the cache table's primary key column.
+        text = 'sha1:' + hashlib.sha1(text.encode('utf-8')).hexdigest()
+    return text
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class LRUCache:
+    """A small thread-safe LRU map whose entries expire after a per-entry TTL."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=_MISSING):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                # Expired entries stay until evicted so they can be served stale.
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def get_stale(self, key, default=_MISSING):
+        """Returns the value for `key` even if it has expired."""
+        with self._lock:
+            item = self._data.get(key)
+            return default if item is None else item[0]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class GeocodeCache:
+    """
+    Two-tier cache for geocoding results: an in-process LRU in front of the
+    `geocode_cache` table. Failed lookups are cached too, with a shorter TTL.
+    The table is read and written through a short-lived session of its own,
+    so a lookup never commits or rolls back the caller's transaction.
+    """
+
+    def __init__(self, app=None):
+        self._memory = LRUCache()
+        self.ttl = 30 * 24 * 3600
+        self.negative_ttl = 3600
+        self.serve_stale = True
+        self._counters = {'memory_hits': 0, 'db_hits': 0, 'negative_hits': 0, 'stale_hits': 0, 'misses': 0}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self._memory = LRUCache(app.config.get('GEOCODE_CACHE_SIZE', 1024))
+        self.ttl = app.config.get('GEOCODE_CACHE_TTL', self.ttl)
+        self.negative_ttl = app.config.get('GEOCODE_NEGATIVE_TTL', self.negative_ttl)
+        self.serve_stale = app.config.get('GEO_SERVE_STALE', self.serve_stale)
+        app.extensions['geocode_cache'] = self
+
+    def lookup(self, address, fetch):
+        """
+        Returns cached coordinates for `address`, calling `fetch()` on a miss.
+        `fetch` returns {'lat', 'lon'} or None when the address cannot be resolved.
+        If `fetch` raises, the last known coordinates are served when available;
+        otherwise the exception propagates and nothing is cached.
+        """
+        key = normalize_address(address)
+        if not key:
+            return None
+
+        coords = self._memory.get(key)
+        if coords is not _MISSING:
+            self._count('memory_hits' if coords else 'negative_hits')
+            return coords
+
+        entry = self._load(key)
+        if entry is not None and entry[1] > 0:
+            coords = entry[0]
+            self._memory.set(key, coords, entry[1])
+            self._count('db_hits' if coords else 'negative_hits')
+            return coords
+
+        self._count('misses')
+        try:
+            coords = fetch()
+        except Exception:
+            stale = self._memory.get_stale(key, None) or (entry[0] if entry else None)
+            if self.serve_stale and stale:
+                self._count('stale_hits')
+                return stale
+            raise
+        self._store(key, coords)
+        return coords
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        hits = stats['memory_hits'] + stats['db_hits'] + stats['negative_hits']
+        lookups = hits + stats['misses']
+        stats['hit_ratio'] = round(hits / lookups, 4) if lookups else 0.0
+        stats['memory_entries'] = len(self._memory)
+        return stats
+
+    def clear(self):
+        self._memory.clear()
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _load(self, key):
+        """Returns (coords, seconds until expiry) from the table, or None."""
+        try:
+            with Session(db.engine) as session:
+                entry = session.get(GeocodeCacheEntry, key)
+                if entry is None:
+                    return None
+                lat, lon, expires_at = entry.lat, entry.lon, entry.expires_at
+        except SQLAlchemyError as e:
+            print(f"Geocode cache read failed: {e}")
+            return None
+
+        coords = None
+        if lat is not None and lon is not None:
+            coords = {'lon': lon, 'lat': lat}
+        return coords, (expires_at - _utcnow()).total_seconds()
+
+    def _store(self, key, coords):
+        ttl = self.ttl if coords else self.negative_ttl
+        self._memory.set(key, coords, ttl)
+        try:
+            with Session(db.engine) as session:
+                session.merge(GeocodeCacheEntry(
+                    address_key=key,
+                    lat=coords['lat'] if coords else None,
+                    lon=coords['lon'] if coords else None,
+                    expires_at=_utcnow() + timedelta(seconds=ttl),
+                ))
+                session.commit()
+        except SQLAlchemyError as e:
+            print(f"Geocode cache write failed: {e}")
+
+
+class RouteCache:
+    """
+    In-process cache of driving routes keyed by origin/destination coordinates
+    snapped to a grid, so nearby points (the same depot geocoded slightly
+    differently) share one entry.
+    """
+
+    def __init__(self, app=None):
+        self._memory = LRUCache(4096)
+        self.ttl = 6 * 3600
+        self.grid_meters = 100
+        self.serve_stale = True
+        self._counters = {'hits': 0, 'stale_hits': 0, 'misses': 0}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self._memory = LRUCache(app.config.get('ROUTE_CACHE_SIZE', 4096))
+        self.ttl = app.config.get('ROUTE_CACHE_TTL', self.ttl)
+        self.grid_meters = app.config.get('ROUTE_CACHE_GRID_METERS', self.grid_meters)
+        self.serve_stale = app.config.get('GEO_SERVE_STALE', self.serve_stale)
+        app.extensions['route_cache'] = self
+
+    def key_for(self, origin, destination):
+        # One degree of latitude is ~111.32 km. Using the same step for
+        # longitude only makes cells narrower away from the equator.
+        step = self.grid_meters / 111320.0
+        return (
+            round(origin['lat'] / step), round(origin['lon'] / step),
+            round(destination['lat'] / step), round(destination['lon'] / step),
+        )
+
+    def lookup(self, origin, destination, fetch):
+        """
+        Returns {'distance_km', 'eta_minutes'} for the snapped coordinate pair,
+        calling `fetch()` on a miss. Empty results are not cached. If `fetch`
+        raises, the last known route for the pair is served when available.
+        """
+        key = self.key_for(origin, destination)
+        details = self._memory.get(key)
+        if details is not _MISSING:
+            self._count('hits')
+            return details
+
+        self._count('misses')
+        try:
+            details = fetch()
+        except Exception:
+            stale = self._memory.get_stale(key, None)
+            if self.serve_stale and stale:
+                self._count('stale_hits')
+                return stale
+            raise
+        if details:
+            self._memory.set(key, details, self.ttl)
+        return details
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        stats['entries'] = len(self._memory)
+        stats['grid_meters'] = self.grid_meters
+        return stats
+
+    def clear(self):
+        self._memory.clear()
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+
+geocode_cache = GeocodeCache()
+route_cache = RouteCache()
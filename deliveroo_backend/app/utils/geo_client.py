@@ -0,0 +1,271 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import requests
+from flask import current_app, g, has_app_context
+from requests.adapters import HTTPAdapter
+
+from app.utils.geo_cache import geocode_cache, route_cache
+from app.utils.metrics import attach, current_timer, track_outbound
+
+
+class GeoUnavailable(Exception):
+    """
+    Raised when Geoapify cannot answer and nothing usable is cached: the
+    breaker is open, the request budget is spent, or the call itself failed.
+    """
+
+
+class CircuitBreaker:
+    """
+    Fails fast after `failure_threshold` consecutive upstream errors. After
+    `reset_timeout` seconds one trial call is let through (half-open); its
+    outcome closes the breaker again or re-opens it.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self.rejected = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """Gives back a half-open trial slot whose call never reached Geoapify."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'times_opened': self.times_opened,
+                'rejected_calls': self.rejected,
+            }
+
+
+class GeoClient:
+    """
+    Shared Geoapify client. Keeps a pooled, keep-alive HTTP session for every
+    geocoding and routing call and runs independent lookups on a small
+    bounded thread pool. Results go through the geocode and route caches.
+
+    Every request gets a total time budget (GEO_REQUEST_BUDGET) that all of
+    its upstream calls share, and a circuit breaker stops calling Geoapify
+    after repeated failures. While it is open, the caches serve the last
+    known results where they have them.
+    """
+
+    def __init__(self, app=None):
+        self.base_url = 'https://api.geoapify.com'
+        self.timeout = 3
+        self.budget = 6
+        self.session = None
+        self.executor = None
+        self.breaker = CircuitBreaker()
+        self._timings = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.base_url = app.config.get('GEOAPIFY_BASE_URL', self.base_url).rstrip('/')
+        self.timeout = app.config.get('GEOAPIFY_TIMEOUT', self.timeout)
+        self.budget = app.config.get('GEO_REQUEST_BUDGET', self.budget)
+        self.breaker = CircuitBreaker(
+            failure_threshold=app.config.get('GEO_BREAKER_FAILURES', 5),
+            reset_timeout=app.config.get('GEO_BREAKER_RESET_SECONDS', 30),
+        )
+        pool_size = app.config.get('GEO_HTTP_POOL_SIZE', 20)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+        self.executor = ThreadPoolExecutor(
+            max_workers=app.config.get('GEO_WORKERS', 8),
+            thread_name_prefix='geo',
+        )
+        app.extensions['geo_client'] = self
+
+    @property
+    def api_key(self):
+        return current_app.config['GEOAPIFY_API_KEY']
+
+    def start_budget(self, seconds=None):
+        """Starts a fresh deadline for the current app context (e.g. per stream tick)."""
+        g.geo_deadline = time.monotonic() + (self.budget if seconds is None else seconds)
+        return g.geo_deadline
+
+    def deadline(self):
+        if not has_app_context():
+            return time.monotonic() + self.budget
+        if 'geo_deadline' not in g:
+            self.start_budget()
+        return g.geo_deadline
+
+    def remaining(self):
+        return self.deadline() - time.monotonic()
+
+    def _get(self, operation, path, params):
+        # Check the budget first: a half-open breaker hands out a single trial
+        # slot, which must not be taken by a call that is never made.
+        timeout = min(self.timeout, self.remaining())
+        if timeout <= 0:
+            raise GeoUnavailable('Geo request budget exhausted')
+        if not self.breaker.allow():
+            raise GeoUnavailable('Geoapify circuit breaker is open')
+
+        started = time.monotonic()
+        try:
+            with track_outbound('geoapify'):
+                response = self.session.get(f"{self.base_url}{path}", params=params, timeout=timeout)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            status = getattr(e.response, 'status_code', None)
+            if status is None or status >= 500 or status == 429:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            self._record(operation, started, failed=True)
+            raise
+        except BaseException:
+            self.breaker.release_trial()
+            raise
+        self.breaker.record_success()
+        self._record(operation, started)
+        return response
+
+    def fetch_geocode(self, location):
+        """Resolves an address through Geoapify. Returns None when there is no match."""
+        response = self._get('geocode', '/v1/geocode/search', {'text': location, 'apiKey': self.api_key})
+        try:
+            coords = response.json()['features'][0]['geometry']['coordinates']
+        except (KeyError, IndexError):
+            return None
+        return {"lon": coords[0], "lat": coords[1]}
+
+    def fetch_route(self, origin, destination):
+        """Asks Geoapify for a driving route. Returns None when no route is found."""
+        response = self._get('route', '/v1/routing', {
+            'waypoints': f"{origin['lat']},{origin['lon']}|{destination['lat']},{destination['lon']}",
+            'mode': 'drive',
+            'apiKey': self.api_key,
+        })
+        try:
+            details = response.json()['features'][0]['properties']
+            return {
+                "distance_km": round(details['distance'] / 1000, 2),
+                "eta_minutes": max(1, int(details['time'] / 60)),
+            }
+        except (KeyError, IndexError):
+            return None
+
+    def geocode(self, location):
+        """
+        Returns {'lat', 'lon'} or None if the address cannot be resolved.
+        Raises GeoUnavailable when Geoapify is unreachable and nothing is cached.
+        """
+        if not location:
+            return None
+        try:
+            return geocode_cache.lookup(location, lambda: self.fetch_geocode(location))
+        except (requests.exceptions.RequestException, ValueError) as e:
+            current_app.logger.warning("Geocoding failed: %s", e)
+            raise GeoUnavailable(f"Geocoding failed: {e}") from e
+
+    def geocode_many(self, *locations):
+        """Geocodes several addresses at once on the shared pool, preserving order."""
+        app = current_app._get_current_object()
+        deadline = self.deadline()
+        timer = current_timer()
+
+        def task(location):
+            with app.app_context(), attach(timer):
+                g.geo_deadline = deadline
+                return self.geocode(location)
+
+        futures = [self.executor.submit(task, location) for location in locations]
+        try:
+            return [future.result(timeout=max(0, deadline - time.monotonic())) for future in futures]
+        except FutureTimeoutError:
+            for future in futures:
+                future.cancel()
+            raise GeoUnavailable('Geo request budget exhausted')
+
+    def route(self, origin, destination):
+        """
+        Returns {'distance_km', 'eta_minutes'} or None if no route was found.
+        Raises GeoUnavailable when Geoapify is unreachable and nothing is cached.
+        """
+        if not origin or not destination:
+            return None
+        try:
+            return route_cache.lookup(origin, destination, lambda: self.fetch_route(origin, destination))
+        except (requests.exceptions.RequestException, ValueError) as e:
+            current_app.logger.warning("Routing failed: %s", e)
+            raise GeoUnavailable(f"Routing failed: {e}") from e
+
+    def stats(self):
+        with self._lock:
+            timings = {operation: dict(data, recent=list(data['recent'])) for operation, data in self._timings.items()}
+        for data in timings.values():
+            recent = sorted(data.pop('recent'))
+            data['p50_ms'] = recent[len(recent) // 2] if recent else None
+            data['p95_ms'] = recent[int(len(recent) * 0.95)] if recent else None
+        return {'breaker': self.breaker.stats(), 'timings': timings}
+
+    def _record(self, operation, started, failed=False):
+        elapsed_ms = round((time.monotonic() - started) * 1000, 1)
+        with self._lock:
+            data = self._timings.setdefault(operation, {
+                'calls': 0, 'errors': 0, 'max_ms': 0.0, 'recent': deque(maxlen=512),
+            })
+            data['calls'] += 1
+            data['errors'] += int(failed)
+            data['max_ms'] = max(data['max_ms'], elapsed_ms)
+            data['recent'].append(elapsed_ms)
+
+
+geo_client = GeoClient()
@@ -1,27 +1,34 @@
-from flask_mail import Message
-from app import mail
-from flask import current_app
-import threading
+from app import db
+from app.models.outbox import EmailOutbox
+from app.utils.mailer import outbox_mailer
 
-def send_async_email(app, msg):
-    with app.app_context():
-        mail.send(msg)
+def queue_email(to, subject, template):
+    """
+    Adds an email to the outbox in the current transaction. It is only sent
+    once the caller commits, so notifications never go out for changes that
+    were rolled back. Call `outbox_mailer.wake()` after committing.
+    """
+    entry = EmailOutbox(recipient=to, subject=subject, html=template)
+    db.session.add(entry)
+    return entry
 
 def send_email(to, subject, template):
-    app = current_app._get_current_object()
-    msg = Message(
-        subject,
-        recipients=[to],
-        html=template,
-        sender=app.config['MAIL_DEFAULT_SENDER']
-    )
-    thr = threading.Thread(target=send_async_email, args=[app, msg])
-    thr.start()
-    return thr
+    """Queues an email on its own and commits it right away."""
+    entry = queue_email(to, subject, template)
+    db.session.commit()
+    outbox_mailer.wake()
+    return entry
 
 def get_full_image_url(filename):
     """Helper to construct the full URL for an image."""
     if not filename:
         return None
 
-    return f"/uploads/{filename}"
\ No newline at end of file
+    return f"/uploads/{filename}"
+
+def get_thumbnail_url(filename):
+    """URL of a small preview of an uploaded image, for list views."""
+    if not filename:
+        return None
+
+    return f"/uploads/derived/thumb/{filename}"
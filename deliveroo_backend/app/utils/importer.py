@@ -0,0 +1,197 @@
+"""
+Bulk parcel import from CSV or NDJSON manifests.
+
+Records are read from the input stream one at a time, validated, and
+inserted IMPORT_BATCH_SIZE at a time as multi-row INSERT ... RETURNING
+statements, each batch with its 'created' parcel events and rollup
+totals, in its own commit. Invalid rows are reported by line number and skipped; they never
+abort the rest of the import. Images are not part of a manifest; attach
+them afterwards with POST /api/parcels/<id>/image.
+
+Used by POST /api/parcels/import and `flask parcels import`.
+"""
+import codecs
+import csv
+import json
+import math
+import time
+
+from app import db
+from app.models.parcel import Parcel
+from app.models.user import User
+from app.utils.events import record_events
+from app.utils.rollups import rollup_created
+
+FORMATS = ('csv', 'ndjson')
+REQUIRED = ('recipient_name', 'pickup_location', 'destination', 'weight')
+# Manifest column -> (max length, or None for numbers)
+COLUMNS = {
+    'recipient_name': 100,
+    'pickup_location': 255,
+    'destination': 255,
+    'weight': None,
+    'sender_phone': 20,
+    'recipient_phone': 20,
+    'estimated_cost': None,
+    'shipping_cost': None,
+}
+MAX_REPORTED_ERRORS = 100
+
+
+def detect_format(content_type, filename=None):
+    """Picks 'csv' or 'ndjson' from a MIME type or file name. Returns None if neither fits."""
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type in ('text/csv', 'application/csv'):
+        return 'csv'
+    if content_type in ('application/x-ndjson', 'application/ndjson', 'application/jsonl'):
+        return 'ndjson'
+    if filename:
+        extension = filename.rsplit('.', 1)[-1].lower()
+        if extension == 'csv':
+            return 'csv'
+        if extension in ('ndjson', 'jsonl'):
+            return 'ndjson'
+    return None
+
+
+def iter_records(stream, fmt):
+    """
+    Yields (line number, record dict or None, error or None) from a binary
+    stream without reading it all into memory.
+    """
+    text = codecs.getreader('utf-8-sig')(stream)
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for record in reader:
+            if None in record:
+                yield reader.line_num, None, 'Too many columns'
+            else:
+                yield reader.line_num, record, None
+        return
+    for line_no, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f'Invalid JSON: {e}'
+            continue
+        if isinstance(record, dict):
+            yield line_no, record, None
+        else:
+            yield line_no, None, 'Each line must be a JSON object'
+
+
+def validate(record):
+    """Returns the Parcel column values for one manifest record. Raises ValueError."""
+    missing = [name for name in REQUIRED if record.get(name) in (None, '')]
+    if missing:
+        raise ValueError(f"Missing {', '.join(missing)}")
+    # Every row gets every column so a batch goes out as one executemany.
+    row = dict.fromkeys(COLUMNS)
+    for name, max_length in COLUMNS.items():
+        value = record.get(name)
+        if value in (None, ''):
+            continue
+        if max_length is None:
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f'{name} must be a number')
+            if value < 0 or not math.isfinite(value):
+                raise ValueError(f'{name} must be a non-negative number')
+        else:
+            value = str(value).strip()
+            if len(value) > max_length:
+                raise ValueError(f'{name} is longer than {max_length} characters')
+        row[name] = value
+    if row['weight'] <= 0:
+        raise ValueError('weight must be greater than zero')
+    return row
+
+
+class ImportReport:
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.batches = 0
+        self.errors = []
+        self.started = time.perf_counter()
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': message})
+
+    def as_dict(self):
+        seconds = time.perf_counter() - self.started
+        return {
+            'imported': self.imported,
+            'failed': self.failed,
+            'batches': self.batches,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+            'seconds': round(seconds, 3),
+            'rows_per_second': round(self.imported / seconds) if seconds else None,
+        }
+
+
+def import_parcels(stream, fmt, user_id, batch_size=1000, allow_user_column=False):
+    """
+    Imports a manifest for `user_id`. With `allow_user_column` (admins and
+    the CLI), a record's own `user_id` column overrides it. Returns an
+    ImportReport.
+    """
+    report = ImportReport()
+    known_users = {user_id} if user_id is not None else set()
+    batch = []
+    for line, record, error in iter_records(stream, fmt):
+        if error is None:
+            try:
+                row = validate(record)
+                row['user_id'] = _owner(record, user_id, allow_user_column, known_users)
+            except ValueError as e:
+                error = str(e)
+        if error is not None:
+            report.error(line, error)
+            continue
+        batch.append(row)
+        if len(batch) >= batch_size:
+            _flush(batch, report)
+            batch = []
+    if batch:
+        _flush(batch, report)
+    return report
+
+
+def _owner(record, user_id, allow_user_column, known_users):
+    owner = record.get('user_id') if allow_user_column else None
+    if owner in (None, ''):
+        if user_id is None:
+            raise ValueError('Missing user_id')
+        return user_id
+    try:
+        owner = int(owner)
+    except (TypeError, ValueError):
+        raise ValueError('user_id must be an integer')
+    if owner not in known_users:
+        if db.session.query(User.id).filter(User.id == owner).first() is None:
+            raise ValueError(f'User {owner} does not exist')
+        known_users.add(owner)
+    return owner
+
+
+def _flush(batch, report):
+    # SQLAlchemy sends this as multi-row INSERTs (insertmanyvalues) and hands
+    # back the new rows for the event log and rollups, on both SQLite and Postgres.
+    table = Parcel.__table__
+    inserted = db.session.execute(table.insert().returning(
+        table.c.id, table.c.created_at, table.c.status,
+        table.c.weight, table.c.shipping_cost, table.c.estimated_cost,
+    ), batch).all()
+    ids = [row.id for row in inserted]
+    record_events(ids, 'created', 'Pending')
+    rollup_created(inserted)
+    db.session.commit()
+    report.imported += len(ids)
+    report.batches += 1
@@ -0,0 +1,285 @@
+"""
+Delivery side of the email outbox.
+
+Route handlers only add EmailOutbox rows (see `queue_email` in helpers),
+in the same commit as the change they describe. A fixed pool of worker
+threads claims due rows in batches and sends each batch over a long-lived
+SMTP connection, retrying transient failures with exponential backoff.
+
+Workers start with the server, not with every process that builds the
+app: on ASGI lifespan startup (app/asgi.py) or, under a WSGI server, with
+the first request it handles. CLI commands and scripts never start them.
+Once running they pick up rows left pending or retrying by a previous
+process. EMAIL_WORKERS=0 disables them; `flask outbox drain` sends
+whatever is due from the command line.
+"""
+import random
+import smtplib
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from flask_mail import Message
+from sqlalchemy import and_, or_
+
+from app import db, mail
+from app.models.outbox import EmailOutbox
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class PermanentFailure(Exception):
+    """The server rejected a message outright (5xx); retrying will not help."""
+
+
+class OutboxMailer:
+    """
+    Bounded pool of outbox workers. Each worker keeps its own SMTP
+    connection open between batches and drops it after EMAIL_SMTP_IDLE_SECONDS
+    without traffic. Claims are leased, so rows held by a crashed worker are
+    picked up again once the lease expires.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.workers = 2
+        self.batch_size = 50
+        self.max_attempts = 5
+        self.retry_base = 30
+        self.poll_interval = 5
+        self.idle_timeout = 30
+        self.lease = 300
+        self._threads = []
+        self._producers = []
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._counters = {'sent': 0, 'retried': 0, 'failed': 0, 'batches': 0, 'connections': 0}
+        self._recent = deque(maxlen=4096)  # Send timestamps, for throughput
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config.get('EMAIL_WORKERS', self.workers)
+        self.batch_size = app.config.get('EMAIL_BATCH_SIZE', self.batch_size)
+        self.max_attempts = app.config.get('EMAIL_MAX_ATTEMPTS', self.max_attempts)
+        self.retry_base = app.config.get('EMAIL_RETRY_BASE_SECONDS', self.retry_base)
+        self.poll_interval = app.config.get('EMAIL_POLL_INTERVAL', self.poll_interval)
+        self.idle_timeout = app.config.get('EMAIL_SMTP_IDLE_SECONDS', self.idle_timeout)
+        app.extensions['outbox_mailer'] = self
+        app.before_request(self._start_with_server)
+
+    def add_producer(self, producer):
+        """Registers a callable run on the workers before each drain, e.g. to queue digests."""
+        if producer not in self._producers:
+            self._producers.append(producer)
+
+    def wake(self):
+        """Called after committing outbox rows so they go out without waiting for a poll."""
+        self._wakeup.set()
+
+    def start(self):
+        """Starts the worker threads, unless EMAIL_WORKERS is 0 or the app is testing. Idempotent."""
+        if not self.app.testing:
+            self._ensure_started()
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            counters = dict(self._counters)
+            last_minute = sum(1 for sent_at in self._recent if now - sent_at <= 60)
+        counters['sent_per_second_1m'] = round(last_minute / 60, 2)
+        counters['workers'] = sum(1 for thread in self._threads if thread.is_alive())
+        counters['queue'] = {
+            status: count for status, count in
+            db.session.query(EmailOutbox.status, db.func.count(EmailOutbox.id))
+            .filter(EmailOutbox.status.in_(['pending', 'sending', 'failed']))
+            .group_by(EmailOutbox.status).all()
+        }
+        return counters
+
+    def drain(self, timeout=10):
+        """Sends everything that is due from the calling thread. Used by `flask outbox drain`, tests and benchmarks."""
+        deadline = time.monotonic() + timeout
+        worker = _Worker(self)
+        try:
+            self._produce(force=True)
+            while time.monotonic() < deadline and worker.run_once():
+                pass
+        finally:
+            worker.close()
+
+    def _start_with_server(self):
+        # WSGI servers have no startup hook; the first request they serve is it.
+        if not self._threads:
+            self.start()
+
+    def _ensure_started(self):
+        if not self.workers:
+            return
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(
+                    target=self._run, name=f'outbox-{len(self._threads)}', daemon=True,
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def _run(self):
+        worker = _Worker(self)
+        while True:
+            # The first pass runs one interval after startup (or on wake()), once
+            # the process has finished setting up, e.g. creating the schema.
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            try:
+                with self.app.app_context():
+                    self._produce()
+                    while worker.run_once():
+                        pass
+                    db.session.remove()
+            except Exception as e:
+                print(f"Email outbox worker failed: {e}")
+                worker.close()
+            worker.close_if_idle()
+
+    def _produce(self, **kwargs):
+        for producer in self._producers:
+            try:
+                producer(**kwargs)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Email producer {producer} failed: {e}")
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+            if name == 'sent':
+                now = time.monotonic()
+                self._recent.extend([now] * amount)
+
+    def _backoff(self, attempts):
+        # 30s, 60s, 120s, ... with +/-20% jitter so retries do not arrive in lockstep
+        return self.retry_base * 2 ** (attempts - 1) * random.uniform(0.8, 1.2)
+
+
+class _Worker:
+    """One worker's SMTP connection and claim loop. Not shared between threads."""
+
+    def __init__(self, mailer):
+        self.mailer = mailer
+        self.connection = None
+        self.last_used = 0
+
+    def run_once(self):
+        """Claims and sends one batch. Returns False when nothing was due."""
+        batch = self._claim()
+        if not batch:
+            return False
+        self.mailer._count('batches')
+        for row in batch:
+            self._deliver(row)
+        db.session.commit()
+        return True
+
+    def _claim(self):
+        now = _utcnow()
+        due = or_(
+            and_(EmailOutbox.status == 'pending', EmailOutbox.next_attempt_at <= now),
+            and_(EmailOutbox.status == 'sending', EmailOutbox.locked_until < now),
+        )
+        ids = [row.id for row in db.session.query(EmailOutbox.id).filter(due)
+               .order_by(EmailOutbox.id).limit(self.mailer.batch_size)]
+        if not ids:
+            db.session.rollback()
+            return []
+        # The conditional UPDATE is what makes a claim exclusive: if another
+        # worker took some of these rows first, they no longer match `due`.
+        token = uuid.uuid4().hex
+        EmailOutbox.query.filter(EmailOutbox.id.in_(ids), due).update({
+            'status': 'sending',
+            'claimed_by': token,
+            'locked_until': now + timedelta(seconds=self.mailer.lease),
+        }, synchronize_session=False)
+        db.session.commit()
+        return EmailOutbox.query.filter_by(claimed_by=token, status='sending').order_by(EmailOutbox.id).all()
+
+    def _deliver(self, row):
+        message = Message(
+            row.subject,
+            recipients=[row.recipient],
+            html=row.html,
+            sender=self.mailer.app.config['MAIL_DEFAULT_SENDER'],
+        )
+        row.attempts += 1
+        try:
+            self._send(message)
+        except PermanentFailure as e:
+            self._fail(row, e)
+            return
+        except Exception as e:
+            if row.attempts >= self.mailer.max_attempts:
+                self._fail(row, e)
+            else:
+                row.status = 'pending'
+                row.last_error = str(e)
+                row.next_attempt_at = _utcnow() + timedelta(seconds=self.mailer._backoff(row.attempts))
+                self.mailer._count('retried')
+            return
+        row.status = 'sent'
+        row.sent_at = _utcnow()
+        row.last_error = None
+        self.mailer._count('sent')
+
+    def _fail(self, row, error):
+        print(f"Giving up on email {row.id} to {row.recipient}: {error}")
+        row.status = 'failed'
+        row.last_error = str(error)
+        self.mailer._count('failed')
+
+    def _send(self, message):
+        for attempt in (1, 2):
+            connection = self._connect()
+            try:
+                connection.send(message)
+                self.last_used = time.monotonic()
+                return
+            except smtplib.SMTPResponseException as e:
+                if e.smtp_code >= 500:
+                    raise PermanentFailure(f"{e.smtp_code} {e.smtp_error!r}")
+                raise
+            except smtplib.SMTPRecipientsRefused as e:
+                raise PermanentFailure(str(e.recipients))
+            except (smtplib.SMTPServerDisconnected, OSError):
+                # The server dropped our idle connection; reconnect once.
+                self.close()
+                if attempt == 2:
+                    raise
+
+    def _connect(self):
+        if self.connection is None:
+            self.connection = mail.connect()
+            self.connection.__enter__()
+            self.last_used = time.monotonic()
+            self.mailer._count('connections')
+        return self.connection
+
+    def close_if_idle(self):
+        if self.connection is not None and time.monotonic() - self.last_used > self.mailer.idle_timeout:
+            self.close()
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.__exit__(None, None, None)
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.connection = None
+
+
+outbox_mailer = OutboxMailer()
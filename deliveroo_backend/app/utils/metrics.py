@@ -0,0 +1,332 @@
+"""
+Per-request performance instrumentation.
+
+Every request gets a RequestTimer that collects where its time went: SQL
+statements (SQLAlchemy cursor events), outbound HTTP calls to Geoapify and
+Stripe, bcrypt and JSON encoding. When the response is ready the totals,
+the wall time and the response size go into histograms labelled by route
+(the URL rule, not the raw path) and method. `/metrics` serves them in the
+Prometheus text format.
+
+With SERVER_TIMING on, responses also carry a `Server-Timing` header, so the
+same breakdown shows up in the browser's network panel.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import Response, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+# Phase -> Server-Timing description. db and http also count calls.
+PHASES = {'db': 'SQL', 'http': 'Outbound HTTP', 'bcrypt': 'Password hashing', 'json': 'JSON encoding'}
+
+_current = ContextVar('request_timer', default=None)
+
+
+class RequestTimer:
+    """Time and call count per phase for one request. Safe to feed from helper threads."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    def add(self, phase, seconds, calls=1):
+        with self._lock:
+            totals = self.phases.setdefault(phase, [0, 0.0])
+            totals[0] += calls
+            totals[1] += seconds
+
+    def get(self, phase):
+        with self._lock:
+            return tuple(self.phases.get(phase, (0, 0.0)))
+
+
+def current_timer():
+    """The RequestTimer of the request being handled on this thread, or None."""
+    return _current.get()
+
+
+@contextmanager
+def attach(timer):
+    """Charges work on a helper thread (e.g. the geo pool) to `timer`."""
+    token = _current.set(timer)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def track(phase):
+    """Adds the time spent in the block to the current request's `phase`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer = _current.get()
+        if timer is not None:
+            timer.add(phase, time.perf_counter() - started)
+
+
+@contextmanager
+def track_outbound(service):
+    """Times one outbound HTTP call, per request and in the process-wide per-service totals."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        timer = _current.get()
+        if timer is not None:
+            timer.add('http', elapsed)
+        request_metrics.outbound.inc((service,), elapsed)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, values, amount):
+        with self._lock:
+            series = self._series.get(values)
+            if series is None:
+                series = self._series[values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if amount <= bound:
+                    series[i] += 1
+                    break  # Buckets are made cumulative when rendered
+            series[-2] += amount
+            series[-1] += 1
+
+    def render(self):
+        with self._lock:
+            snapshot = {values: list(series) for values, series in self._series.items()}
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for values, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f'{self.name}_bucket{_labels(self.labels, values, le)} {cumulative}')
+            le = 'le="+Inf"'
+            lines.append(f'{self.name}_bucket{_labels(self.labels, values, le)} {series[-1]}')
+            lines.append(f'{self.name}_sum{_labels(self.labels, values)} {_number(series[-2])}')
+            lines.append(f'{self.name}_count{_labels(self.labels, values)} {series[-1]}')
+        return lines
+
+
+class CallCounter:
+    """A `<name>_total` call counter and `<name>_seconds_total` time counter sharing labels."""
+
+    def __init__(self, name, help, seconds_help, labels):
+        self.name = name
+        self.help = help
+        self.seconds_help = seconds_help
+        self.labels = labels
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, values, seconds):
+        with self._lock:
+            series = self._series.setdefault(values, [0, 0.0])
+            series[0] += 1
+            series[1] += seconds
+
+    def render(self):
+        with self._lock:
+            snapshot = {values: list(series) for values, series in self._series.items()}
+        lines = [f'# HELP {self.name}_total {self.help}', f'# TYPE {self.name}_total counter']
+        lines += [f'{self.name}_total{_labels(self.labels, values)} {calls}'
+                  for values, (calls, _) in sorted(snapshot.items())]
+        lines += [f'# HELP {self.name}_seconds_total {self.seconds_help}',
+                  f'# TYPE {self.name}_seconds_total counter']
+        lines += [f'{self.name}_seconds_total{_labels(self.labels, values)} {_number(seconds)}'
+                  for values, (_, seconds) in sorted(snapshot.items())]
+        return lines
+
+
+class _SizedBody:
+    """Wraps a streamed response body to learn its size once it has been sent."""
+
+    def __init__(self, body, observe):
+        self._body = body
+        self._observe = observe
+        self.size = 0
+
+    def __iter__(self):
+        for chunk in self._body:
+            self.size += len(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+            yield chunk
+
+    def close(self):
+        observe, self._observe = self._observe, None
+        if observe is not None:
+            observe(self.size)
+        close = getattr(self._body, 'close', None)
+        if close is not None:
+            close()
+
+
+class RequestMetrics:
+    """Request histograms, process-wide SQL and outbound counters, and the /metrics view."""
+
+    def __init__(self, app=None):
+        self.token = None
+        self.server_timing = False
+        route = ('method', 'route')
+        self.requests = CallCounter('http_requests', 'HTTP requests handled',
+                                    'Wall time of those requests', route + ('status',))
+        self.histograms = {
+            'duration': Histogram('http_request_duration_seconds',
+                                  'Wall time from routing to the response being ready', route, DURATION_BUCKETS),
+            'db_calls': Histogram('http_request_db_queries', 'SQL statements per request', route, COUNT_BUCKETS),
+            'db': Histogram('http_request_db_seconds', 'SQL time per request', route, DURATION_BUCKETS),
+            'http_calls': Histogram('http_request_outbound_calls',
+                                    'Outbound HTTP calls (Geoapify, Stripe) per request', route, COUNT_BUCKETS),
+            'http': Histogram('http_request_outbound_seconds', 'Outbound HTTP time per request', route,
+                              DURATION_BUCKETS),
+            'bcrypt': Histogram('http_request_bcrypt_seconds', 'Password hashing time per request, queueing included',
+                                route, DURATION_BUCKETS),
+            'json': Histogram('http_request_json_seconds', 'JSON encoding time per request', route, DURATION_BUCKETS),
+            'size': Histogram('http_response_size_bytes', 'Response body size', route, SIZE_BUCKETS),
+        }
+        self.queries = CallCounter('db_queries', 'SQL statements executed, background work included',
+                                   'Time spent executing them', ())
+        self.outbound = CallCounter('outbound_requests', 'Outbound HTTP calls per service',
+                                    'Time spent waiting on them', ('service',))
+        self._sql_listening = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.token = app.config.get('METRICS_TOKEN')
+        self.server_timing = app.config.get('SERVER_TIMING', False)
+        if not self._sql_listening:
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(Engine, 'handle_error', _handle_error)
+            self._sql_listening = True
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._detach)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+        app.extensions['request_metrics'] = self
+
+    def _start(self):
+        timer = RequestTimer()
+        g.metrics_token = _current.set(timer)
+        g.metrics_timer = timer
+
+    def _finish(self, response):
+        timer = g.pop('metrics_timer', None)
+        if timer is None:
+            return response
+        elapsed = time.perf_counter() - timer.started
+        labels = (request.method, request.url_rule.rule if request.url_rule else 'unmatched')
+        self.requests.inc(labels + (str(response.status_code),), elapsed)
+        self.histograms['duration'].observe(labels, elapsed)
+        for phase in PHASES:
+            calls, seconds = timer.get(phase)
+            self.histograms[phase].observe(labels, seconds)
+            if f'{phase}_calls' in self.histograms:
+                self.histograms[f'{phase}_calls'].observe(labels, calls)
+
+        size = self.histograms['size']
+        if response.content_length is not None:
+            size.observe(labels, response.content_length)
+        elif response.is_streamed:
+            response.response = _SizedBody(response.response, lambda sent: size.observe(labels, sent))
+        else:
+            size.observe(labels, len(response.get_data()))
+
+        if self.server_timing:
+            response.headers['Server-Timing'] = _server_timing(timer, elapsed)
+            response.headers['Timing-Allow-Origin'] = '*'
+        return response
+
+    def _detach(self, exc=None):
+        token = g.pop('metrics_token', None)
+        if token is not None:
+            try:
+                _current.reset(token)
+            except ValueError:  # Torn down from another context (end of a stream_with_context body)
+                _current.set(None)
+
+    def metrics_view(self):
+        if self.token and request.headers.get('Authorization') != f'Bearer {self.token}':
+            return {'message': 'Metrics token required'}, 401
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+    def render(self):
+        lines = self.requests.render()
+        for histogram in self.histograms.values():
+            lines += histogram.render()
+        lines += self.queries.render()
+        lines += self.outbound.render()
+        return '\n'.join(lines) + '\n'
+
+
+def _server_timing(timer, elapsed):
+    entries = []
+    for phase, description in PHASES.items():
+        calls, seconds = timer.get(phase)
+        if calls:
+            if phase in ('db', 'http'):
+                description = f'{description} ({calls} call{"s" if calls != 1 else ""})'
+            entries.append(f'{phase};dur={seconds * 1000:.1f};desc="{description}"')
+    entries.append(f'total;dur={elapsed * 1000:.1f}')
+    return ', '.join(entries)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _query_done(conn)
+
+
+def _handle_error(context):
+    if context.connection is not None:
+        _query_done(context.connection)
+
+
+def _query_done(conn):
+    started = conn.info.get('metrics_query_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    request_metrics.queries.inc((), elapsed)
+    timer = _current.get()
+    if timer is not None:
+        timer.add('db', elapsed)
+
+
+request_metrics = RequestMetrics()
@@ -0,0 +1,140 @@
+"""
+Coalesces parcel update emails.
+
+Status and location handlers record a ParcelNotification in the same
+commit as the change. Once a customer's oldest pending notification is
+NOTIFY_COALESCE_SECONDS old, everything pending for them is rendered into a
+single digest and handed to the email outbox. A courier scan that moves a
+parcel and then changes its status, or a sweep over twenty of one
+customer's parcels, becomes one email instead of two or forty.
+"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func
+
+from app import db
+from app.models.notification import ParcelNotification
+from app.models.user import User
+from app.utils.helpers import queue_email
+from app.utils.mailer import outbox_mailer
+
+TEMPLATE = 'email/parcel_updates.html'
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class NotificationCoalescer:
+    """Groups pending parcel notifications per customer and renders one digest each."""
+
+    def __init__(self, app=None):
+        self.window = 60
+        self.batch_size = 100
+        self.template = None
+        self._flushing = threading.Lock()
+        self._lock = threading.Lock()
+        self._counters = {'notifications': 0, 'digests': 0, 'render_ms': 0.0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.window = app.config.get('NOTIFY_COALESCE_SECONDS', self.window)
+        # Compiled once here; every digest reuses the same template object.
+        self.template = app.jinja_env.get_template(TEMPLATE)
+        outbox_mailer.add_producer(self.flush)
+        app.extensions['notification_coalescer'] = self
+
+    def add(self, parcel, kind, value):
+        """Records a 'status' or 'location' change for the parcel's owner. The caller commits."""
+        db.session.add(ParcelNotification(user_id=parcel.user_id, parcel_id=parcel.id, kind=kind, value=value))
+        with self._lock:
+            self._counters['notifications'] += 1
+
+    def add_many(self, parcels, kind, value):
+        """Records the same change for many (id, user_id) rows with one multi-row INSERT."""
+        if not parcels:
+            return
+        now = _utcnow()
+        db.session.execute(ParcelNotification.__table__.insert(), [
+            {'user_id': row.user_id, 'parcel_id': row.id, 'kind': kind, 'value': value, 'created_at': now}
+            for row in parcels
+        ])
+        with self._lock:
+            self._counters['notifications'] += len(parcels)
+
+    def flush(self, force=False):
+        """
+        Turns every customer whose coalescing window has closed into one
+        queued digest. Runs on the outbox workers; returns the digest count.
+        """
+        if not self._flushing.acquire(blocking=False):
+            return 0  # Another worker in this process is already flushing
+        try:
+            cutoff = _utcnow() - timedelta(seconds=0 if force else self.window)
+            user_ids = [
+                row.user_id for row in
+                db.session.query(ParcelNotification.user_id)
+                .group_by(ParcelNotification.user_id)
+                .having(func.min(ParcelNotification.created_at) <= cutoff)
+                .limit(self.batch_size)
+            ]
+            return sum(1 for user_id in user_ids if self._send_digest(user_id))
+        finally:
+            self._flushing.release()
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        counters['render_ms'] = round(counters['render_ms'], 1)
+        counters['pending'] = db.session.query(func.count(ParcelNotification.id)).scalar()
+        if counters['digests']:
+            counters['notifications_per_email'] = round(counters['notifications'] / counters['digests'], 2)
+        return counters
+
+    def _send_digest(self, user_id):
+        rows = ParcelNotification.query.filter_by(user_id=user_id).order_by(ParcelNotification.id).all()
+        ids = [row.id for row in rows]
+        user = db.session.get(User, user_id)
+
+        if user is not None:
+            # Latest status and location per parcel, in the order they first changed.
+            parcels = {}
+            for row in rows:
+                parcel = parcels.setdefault(row.parcel_id, {'id': row.parcel_id, 'status': None, 'location': None})
+                parcel[row.kind] = row.value
+            parcels = list(parcels.values())
+
+            started = time.perf_counter()
+            html = self.template.render(username=user.username, parcels=parcels)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            queue_email(user.email, self._subject(parcels), html)
+
+        deleted = ParcelNotification.query.filter(ParcelNotification.id.in_(ids)).delete(synchronize_session=False)
+        if deleted != len(ids):
+            # Another process sent this digest first.
+            db.session.rollback()
+            return False
+        db.session.commit()
+
+        if user is None:
+            return False
+        with self._lock:
+            self._counters['digests'] += 1
+            self._counters['render_ms'] += elapsed_ms
+        return True
+
+    def _subject(self, parcels):
+        if len(parcels) == 1:
+            parcel = parcels[0]
+            if parcel['status'] and not parcel['location']:
+                return f"Deliveroo Update: Parcel #{parcel['id']} Status"
+            if parcel['location'] and not parcel['status']:
+                return f"Deliveroo Update: Parcel #{parcel['id']} Location"
+            return f"Deliveroo Update: Parcel #{parcel['id']}"
+        return f"Deliveroo Update: {len(parcels)} parcels"
+
+
+notification_coalescer = NotificationCoalescer()
@@ -0,0 +1,71 @@
+import base64
+from datetime import datetime
+
+from sqlalchemy import String, and_, or_, type_coerce
+
+from app import db
+from app.models.parcel import Parcel
+
+
+def encode_cursor(created_at, parcel_id):
+    """Opaque cursor pointing just after the given (created_at, id) position."""
+    raw = f"{created_at.isoformat()}|{parcel_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Returns (created_at, id). Raises ValueError for malformed cursors."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        created_at, parcel_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(parcel_id)
+    except (TypeError, UnicodeDecodeError, ValueError, base64.binascii.Error):
+        raise ValueError('Invalid cursor')
+
+
+def parse_limit(value, default=50, maximum=500):
+    """Parses a ?limit= value, clamped to [1, maximum]. Raises ValueError."""
+    if value is None:
+        return default
+    limit = int(value)
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return min(limit, maximum)
+
+
+def newest_first(query):
+    """Orders a Parcel query by (created_at, id) descending, the keyset used for paging."""
+    return query.order_by(Parcel.created_at.desc(), Parcel.id.desc())
+
+
+def keyset_page(query, limit, cursor=None):
+    """
+    Returns (rows, next_cursor) for one page of a newest-first Parcel query.
+    Seeks past the cursor on the (created_at, id) index instead of using
+    OFFSET, so every page costs the same no matter how deep it is.
+    """
+    if cursor:
+        created_at, parcel_id = decode_cursor(cursor)
+        column, value = _comparable_created_at(created_at)
+        query = query.filter(or_(
+            column < value,
+            and_(column == value, Parcel.id < parcel_id),
+        ))
+    rows = newest_first(query).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows, next_cursor
+
+
+def _comparable_created_at(value):
+    # SQLite keeps server-default timestamps as 'YYYY-MM-DD HH:MM:SS' text, but
+    # binds datetimes with a '.ffffff' suffix, so equal values compare unequal.
+    # Compare as text in the stored format there.
+    if db.engine.dialect.name == 'sqlite':
+        text = value.strftime('%Y-%m-%d %H:%M:%S')
+        if value.microsecond:
+            text += value.strftime('.%f')
+        return type_coerce(Parcel.created_at, String), text
+    return Parcel.created_at, value
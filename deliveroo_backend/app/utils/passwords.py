@@ -0,0 +1,111 @@
+"""
+Password hashing off the request threads.
+
+bcrypt is deliberately the most expensive thing the API does. Every hash
+and check runs on one bounded pool of PASSWORD_HASH_WORKERS threads (bcrypt
+releases the GIL, so these use real cores), which caps how much CPU a login
+burst can take from the other endpoints on the worker. When more than
+PASSWORD_HASH_MAX_QUEUE requests are already waiting, new ones fail fast
+with HasherBusy instead of piling up behind the burst.
+
+The work factor is BCRYPT_LOG_ROUNDS. Hashes stored with a different cost
+are rehashed at the next successful login (see `needs_rehash`).
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import bcrypt
+from app.utils.metrics import track
+
+
+class HasherBusy(Exception):
+    """Too many password operations are already queued."""
+
+
+class PasswordHasher:
+    """Bounded executor for bcrypt, with queue-depth and latency counters."""
+
+    def __init__(self, app=None):
+        self.rounds = 12
+        self.workers = max(1, os.cpu_count() or 1)
+        self.max_queue = 64
+        self._pool = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._counters = {'hashed': 0, 'checked': 0, 'rehashed': 0, 'rejected': 0, 'max_queue_depth': 0,
+                          'wait_ms': 0.0, 'work_ms': 0.0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.rounds = app.config.get('BCRYPT_LOG_ROUNDS', self.rounds)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS') or self.workers
+        self.max_queue = app.config.get('PASSWORD_HASH_MAX_QUEUE', self.max_queue)
+        app.extensions['password_hasher'] = self
+
+    def hash(self, password):
+        """Returns a new bcrypt hash of `password` at the configured cost, as text."""
+        return self._run('hashed', lambda: bcrypt.generate_password_hash(password, self.rounds).decode('utf-8'))
+
+    def check(self, password_hash, password):
+        return self._run('checked', lambda: bcrypt.check_password_hash(password_hash, password))
+
+    def needs_rehash(self, password_hash):
+        """True when a stored hash was made with a different cost than BCRYPT_LOG_ROUNDS."""
+        try:
+            return int(password_hash.split('$')[2]) != self.rounds
+        except (AttributeError, IndexError, ValueError):
+            return False
+
+    def count_rehash(self):
+        with self._lock:
+            self._counters['rehashed'] += 1
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+            counters['queue_depth'] = max(0, self._in_flight - self.workers)
+            counters['in_flight'] = self._in_flight
+        operations = counters['hashed'] + counters['checked']
+        wait_ms = counters.pop('wait_ms')
+        work_ms = counters.pop('work_ms')
+        if operations:
+            counters['avg_wait_ms'] = round(wait_ms / operations, 1)
+            counters['avg_work_ms'] = round(work_ms / operations, 1)
+        counters.update(rounds=self.rounds, workers=self.workers, max_queue=self.max_queue)
+        return counters
+
+    def _run(self, counter, work):
+        with self._lock:
+            if self._in_flight - self.workers >= self.max_queue:
+                self._counters['rejected'] += 1
+                raise HasherBusy('Too many password operations in progress')
+            self._in_flight += 1
+            depth = max(0, self._in_flight - self.workers)
+            self._counters['max_queue_depth'] = max(self._counters['max_queue_depth'], depth)
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bcrypt')
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            try:
+                return work()
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self._counters[counter] += 1
+                    self._counters['wait_ms'] += (started - submitted) * 1000
+                    self._counters['work_ms'] += (finished - started) * 1000
+
+        try:
+            with track('bcrypt'):
+                return self._pool.submit(timed).result()
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,201 @@
+"""
+Who is making the request, resolved at most once per request.
+
+Role checks trust the `is_admin` claim that `login` signs into the access
+token, so they need no database round trip. The claim is only ignored for
+tokens that predate it, or that were issued before the user's role last
+changed; those fall back to a short-TTL cache of user flags.
+
+Changing a User's `is_admin` or deleting the user appends a row to
+`user_role_changes` in the same transaction. Every process reads the new
+rows at most every USER_FLAGS_SYNC_SECONDS, so a demoted or deleted admin
+loses their rights in all workers within that interval, not only in the
+process that made the change.
+"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from flask import g
+from flask_jwt_extended import get_jwt
+from sqlalchemy import event, inspect
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.role_change import UserRoleChange
+from app.models.user import User
+
+# Change IDs are allocated before commit, so a slow transaction can commit an
+# older ID after a newer one was seen; each sync re-reads this many IDs back.
+ROLE_CHANGE_LOOKBACK = 100
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class Principal:
+    """The authenticated caller: a user ID and whether they are an admin."""
+
+    def __init__(self, user_id, is_admin):
+        self.user_id = user_id
+        self.is_admin = bool(is_admin)
+
+    def can_access(self, parcel_owner_id):
+        return self.is_admin or parcel_owner_id == self.user_id
+
+    def __repr__(self):
+        return f'<Principal {self.user_id}{" admin" if self.is_admin else ""}>'
+
+
+class UserFlagCache:
+    """
+    In-process TTL cache of {user_id: is_admin} (None for users that no
+    longer exist). Also remembers when each user's role last changed, in
+    any process, so tokens signed before that moment stop being trusted.
+    """
+
+    def __init__(self, app=None):
+        self.ttl = 60
+        self.sync_interval = 2
+        self.token_lifetime = 3600
+        self._flags = {}
+        self._changed = {}
+        self._lock = threading.Lock()
+        self._syncing = threading.Lock()
+        self._next_sync = 0.0
+        self._watermark = 0
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('USER_FLAGS_TTL', self.ttl)
+        self.sync_interval = app.config.get('USER_FLAGS_SYNC_SECONDS', self.sync_interval)
+        expires = app.config.get('JWT_ACCESS_TOKEN_EXPIRES')
+        if expires:
+            self.token_lifetime = expires.total_seconds()
+        app.extensions['user_flags'] = self
+
+    def is_admin(self, user_id):
+        """Returns the user's is_admin flag, or None if the user does not exist."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._flags.get(user_id)
+            if entry is not None and entry[1] > now:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        row = db.session.query(User.is_admin).filter(User.id == user_id).first()
+        flag = bool(row.is_admin) if row else None
+        with self._lock:
+            self._flags[user_id] = (flag, now + self.ttl)
+        return flag
+
+    def changed_since(self, user_id, issued_at):
+        with self._lock:
+            changed_at = self._changed.get(user_id)
+        return changed_at is not None and issued_at is not None and issued_at <= changed_at
+
+    def sync(self):
+        """
+        Applies the role changes committed by any process since the last
+        sync. Runs at most once every `sync_interval` seconds per process.
+        """
+        now = time.monotonic()
+        if now < self._next_sync or not self._syncing.acquire(blocking=False):
+            return
+        try:
+            self._next_sync = now + self.sync_interval
+            # Own session, so a failure cannot break the request's transaction.
+            with Session(db.engine) as session:
+                rows = session.query(UserRoleChange.id, UserRoleChange.user_id, UserRoleChange.changed_at).filter(
+                    UserRoleChange.id > self._watermark - ROLE_CHANGE_LOOKBACK
+                ).all()
+            for row in rows:
+                self.invalidate(row.user_id, changed_at=row.changed_at.replace(tzinfo=timezone.utc).timestamp())
+            if rows:
+                self._watermark = max(self._watermark, max(row.id for row in rows))
+        except SQLAlchemyError as e:
+            print(f"User role sync failed: {e}")
+        finally:
+            self._syncing.release()
+
+    def invalidate(self, *user_ids, changed_at=None):
+        now = time.time()
+        changed_at = now if changed_at is None else changed_at
+        with self._lock:
+            for user_id in user_ids:
+                if self._changed.get(user_id, 0) >= changed_at:
+                    continue  # Already applied
+                self._flags.pop(user_id, None)
+                self._changed[user_id] = changed_at
+            # Forget changes older than any token that could still be valid.
+            cutoff = now - self.token_lifetime
+            for user_id in [uid for uid, at in self._changed.items() if at < cutoff]:
+                del self._changed[user_id]
+
+    def clear(self):
+        with self._lock:
+            self._flags.clear()
+            self._changed.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._flags), 'role_changes': len(self._changed), 'hits': self.hits, 'misses': self.misses}
+
+
+user_flags = UserFlagCache()
+
+
+def resolve_principal(claims):
+    """Builds the Principal for decoded access-token claims."""
+    user_id = int(claims['sub'])
+    user_flags.sync()
+    is_admin = claims.get('is_admin')
+    if is_admin is None or user_flags.changed_since(user_id, claims.get('iat')):
+        is_admin = user_flags.is_admin(user_id)
+    return Principal(user_id, is_admin)
+
+
+def current_principal():
+    """The Principal for the current request. Call after the JWT has been verified."""
+    if 'principal' not in g:
+        g.principal = resolve_principal(get_jwt())
+    return g.principal
+
+
+def _record_role_change(connection, target):
+    # Same transaction as the change itself; other processes pick it up in sync().
+    now = _utcnow()
+    table = UserRoleChange.__table__
+    connection.execute(table.insert(), {'user_id': target.id, 'changed_at': now})
+    connection.execute(table.delete().where(
+        table.c.changed_at < now - timedelta(seconds=user_flags.token_lifetime)
+    ))
+    inspect(target).session.info.setdefault('role_changes', set()).add(target.id)
+
+
+@event.listens_for(User, 'after_update')
+def _track_role_change(mapper, connection, target):
+    if inspect(target).attrs.is_admin.history.has_changes():
+        _record_role_change(connection, target)
+
+
+@event.listens_for(User, 'after_delete')
+def _track_user_delete(mapper, connection, target):
+    _record_role_change(connection, target)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_user_flags(session):
+    changed = session.info.pop('role_changes', None)
+    if changed:
+        user_flags.invalidate(*changed)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_role_changes(session):
+    session.info.pop('role_changes', None)
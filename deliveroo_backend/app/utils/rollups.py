@@ -0,0 +1,224 @@
+"""
+Per-day, per-status parcel totals for the admin dashboard.
+
+`parcel_daily_rollups` holds one row per (creation day, current status)
+with the parcel count, total weight, shipping revenue and insured value.
+Every write that creates parcels or changes their status applies its
+delta in the same transaction, so the table always agrees with `parcels`
+and dashboard queries read a few hundred rows instead of scanning every
+parcel. Status changes go through `change_status`, whose conditional
+UPDATE makes sure concurrent transitions of one parcel each move it out of
+the bucket it was really in. `flask parcels rebuild-rollups` recomputes the
+table from scratch.
+"""
+from collections import defaultdict
+
+from sqlalchemy import func, text
+
+from app import db
+from app.models.parcel import Parcel
+from app.models.rollup import ParcelDailyRollup
+
+MEASURES = ('parcels', 'total_weight', 'shipping_revenue', 'insured_value')
+DEFAULT_STATUS = 'Pending'
+# What change_status needs to know about each parcel it moves
+TRANSITION_COLUMNS = (
+    Parcel.id, Parcel.user_id, Parcel.status, Parcel.created_at,
+    Parcel.weight, Parcel.shipping_cost, Parcel.estimated_cost,
+)
+TRANSITION_ATTEMPTS = 5
+
+
+def _measures(parcel):
+    return (1, parcel.weight or 0, parcel.shipping_cost or 0, parcel.estimated_cost or 0)
+
+
+def _key(parcel, status):
+    return parcel.created_at.date(), status or DEFAULT_STATUS
+
+
+def rollup_created(parcels):
+    """
+    Adds new parcels to the rollup. Each needs created_at, status, weight,
+    shipping_cost and estimated_cost. The caller commits.
+    """
+    deltas = defaultdict(lambda: [0, 0.0, 0.0, 0.0])
+    for parcel in parcels:
+        if parcel.created_at is None:
+            continue
+        totals = deltas[_key(parcel, parcel.status)]
+        for i, value in enumerate(_measures(parcel)):
+            totals[i] += value
+    _apply(deltas)
+
+
+def change_status(rows, new_status, values=None, skip=()):
+    """
+    Sets `new_status` (and any other columns in `values`) on the parcels in
+    `rows` and moves them between rollup buckets. `rows` are Parcel objects
+    or TRANSITION_COLUMNS projections as read by the caller.
+
+    Each UPDATE only matches parcels whose status is still the one that was
+    read; parcels changed concurrently are read again and retried, and are
+    left alone if their status is now in `skip`. Returns the rows actually
+    moved, carrying their old status. The caller commits.
+    """
+    table = Parcel.__table__
+    values = dict(values or {}, status=new_status, updated_at=func.now())
+    returning = db.engine.dialect.update_returning
+    moved = []
+    pending = list(rows)
+    for _ in range(TRANSITION_ATTEMPTS):
+        if not pending:
+            break
+        ids = [row.id for row in pending]
+        if not returning:
+            # No UPDATE ... RETURNING (e.g. MySQL): read the statuses under row locks instead.
+            pending = db.session.query(*TRANSITION_COLUMNS).filter(Parcel.id.in_(ids)).with_for_update().all()
+        pending = [row for row in pending if row.status not in skip]
+        ids = [row.id for row in pending]
+
+        by_status = defaultdict(list)
+        for row in pending:
+            by_status[row.status].append(row)
+        changed = set()
+        for old_status, group in by_status.items():
+            group_ids = [row.id for row in group]
+            statement = table.update().where(
+                table.c.id.in_(group_ids),
+                table.c.status.is_(None) if old_status is None else table.c.status == old_status,
+            ).values(values)
+            if returning:
+                changed.update(db.session.execute(statement.returning(table.c.id)).scalars())
+            else:
+                db.session.execute(statement)
+                changed.update(group_ids)
+
+        moved += [row for row in pending if row.id in changed]
+        lost = [parcel_id for parcel_id in ids if parcel_id not in changed]
+        pending = db.session.query(*TRANSITION_COLUMNS).filter(Parcel.id.in_(lost)).all() if lost else []
+
+    rollup_status_changed(moved, new_status)
+    for row in rows:
+        if isinstance(row, Parcel):
+            db.session.expire(row, list(values))  # Reload the written columns on next access
+    return moved
+
+
+def rollup_status_changed(parcels, new_status):
+    """
+    Moves parcels from their current status to `new_status` in the rollup.
+    `parcel.status` must be the old status as it was when the row was
+    written; use `change_status` rather than calling this directly. The
+    caller commits.
+    """
+    deltas = defaultdict(lambda: [0, 0.0, 0.0, 0.0])
+    for parcel in parcels:
+        if parcel.created_at is None or (parcel.status or DEFAULT_STATUS) == new_status:
+            continue
+        measures = _measures(parcel)
+        old, new = deltas[_key(parcel, parcel.status)], deltas[_key(parcel, new_status)]
+        for i, value in enumerate(measures):
+            old[i] -= value
+            new[i] += value
+    _apply(deltas)
+
+
+def _apply(deltas):
+    rows = [
+        dict(zip(MEASURES, totals), day=day, status=status)
+        for (day, status), totals in sorted(deltas.items())  # Fixed lock order across writers
+        if any(totals)
+    ]
+    if not rows:
+        return
+    table = ParcelDailyRollup.__table__
+    dialect = db.engine.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        statement = insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.day, table.c.status],
+            set_={name: table.c[name] + statement.excluded[name] for name in MEASURES},
+        )
+        db.session.execute(statement, rows)
+        return
+    for row in rows:
+        updated = db.session.execute(
+            table.update()
+            .where(table.c.day == row['day'], table.c.status == row['status'])
+            .values({name: table.c[name] + row[name] for name in MEASURES})
+        )
+        if not updated.rowcount:
+            db.session.execute(table.insert(), row)
+
+
+def rebuild_rollups():
+    """Recomputes the whole rollup table from `parcels` in one transaction. Returns the row count."""
+    table = ParcelDailyRollup.__table__
+    if db.engine.dialect.name == 'postgresql':
+        # Writers queue behind the rebuild and apply their deltas to the fresh totals.
+        db.session.execute(text('LOCK TABLE parcel_daily_rollups IN EXCLUSIVE MODE'))
+    db.session.execute(table.delete())
+    day = func.date(Parcel.created_at)
+    status = func.coalesce(Parcel.status, DEFAULT_STATUS)
+    totals = (
+        db.select(
+            day, status, func.count(),
+            func.coalesce(func.sum(Parcel.weight), 0),
+            func.coalesce(func.sum(Parcel.shipping_cost), 0),
+            func.coalesce(func.sum(Parcel.estimated_cost), 0),
+        )
+        .where(Parcel.created_at.isnot(None))
+        .group_by(day, status)
+    )
+    db.session.execute(table.insert().from_select(['day', 'status', *MEASURES], totals))
+    db.session.commit()
+    return db.session.query(func.count()).select_from(table).scalar()
+
+
+def _rounded(totals):
+    return {name: round(value, 2) if name != 'parcels' else value for name, value in totals.items()}
+
+
+def rollup_summary(start=None, end=None, status=None):
+    """
+    Dashboard KPIs for parcels created between `start` and `end` (dates,
+    inclusive): overall totals, totals per status and a per-day series.
+    """
+    query = ParcelDailyRollup.query.filter(ParcelDailyRollup.parcels != 0)
+    if start is not None:
+        query = query.filter(ParcelDailyRollup.day >= start)
+    if end is not None:
+        query = query.filter(ParcelDailyRollup.day <= end)
+    if status:
+        query = query.filter(ParcelDailyRollup.status == status)
+
+    overall = dict.fromkeys(MEASURES, 0)
+    by_status = {}
+    by_day = {}
+    for row in query.order_by(ParcelDailyRollup.day, ParcelDailyRollup.status):
+        day = by_day.setdefault(row.day, dict(dict.fromkeys(MEASURES, 0), statuses={}))
+        per_status = by_status.setdefault(row.status, dict.fromkeys(MEASURES, 0))
+        for name in MEASURES:
+            value = getattr(row, name)
+            overall[name] += value
+            per_status[name] += value
+            day[name] += value
+        day['statuses'][row.status] = row.parcels
+
+    overall = _rounded(overall)
+    overall['average_shipping_cost'] = (
+        round(overall['shipping_revenue'] / overall['parcels'], 2) if overall['parcels'] else None
+    )
+    return {
+        'totals': overall,
+        'by_status': {name: _rounded(totals) for name, totals in by_status.items()},
+        'by_day': [
+            dict(_rounded({name: totals[name] for name in MEASURES}), day=day.isoformat(), statuses=totals['statuses'])
+            for day, totals in by_day.items()
+        ],
+    }
@@ -0,0 +1,111 @@
+"""
+Indexed parcel search over recipient name, pickup, destination, present
+location and both phone numbers.
+
+On PostgreSQL this uses the GIN indexes from the search migration: a
+'simple' tsvector for ranked prefix matching and a pg_trgm index so partial
+phone numbers and mid-word fragments are found too. On SQLite it queries the
+`parcels_fts` FTS5 table (kept in sync by triggers) and ranks with bm25. Any
+other backend, or a SQLite database created without migrations, falls back
+to an unindexed ILIKE scan.
+"""
+import re
+
+from sqlalchemy import false, func, inspect, literal, literal_column, or_, text, Float, Integer
+
+from app import db
+from app.models.parcel import Parcel
+
+SEARCH_COLUMNS = (
+    'recipient_name', 'pickup_location', 'destination',
+    'present_location', 'sender_phone', 'recipient_phone',
+)
+MAX_TERMS = 8
+
+# Must stay identical to the indexed expressions in the search migration,
+# otherwise PostgreSQL will not use the indexes.
+_PG_DOCUMENT_SQL = " || ' ' || ".join(f"coalesce(parcels.{column}, '')" for column in SEARCH_COLUMNS)
+PG_DOCUMENT = literal_column(f"({_PG_DOCUMENT_SQL})")
+PG_TSVECTOR = literal_column(f"to_tsvector('simple', {_PG_DOCUMENT_SQL})")
+
+_fts_available = {}
+
+
+def search_terms(term):
+    """Splits user input into at most MAX_TERMS lowercase word tokens."""
+    return re.findall(r'\w+', (term or '').casefold())[:MAX_TERMS]
+
+
+def _like_pattern(term):
+    escaped = term.strip().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def _backend():
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        return 'postgresql'
+    if dialect == 'sqlite':
+        if db.engine not in _fts_available:
+            _fts_available[db.engine] = inspect(db.engine).has_table('parcels_fts')
+        if _fts_available[db.engine]:
+            return 'sqlite'
+    return None
+
+
+def _criteria(term, tokens):
+    backend = _backend()
+    if backend == 'postgresql':
+        tsquery = func.to_tsquery('simple', ' & '.join(f'{token}:*' for token in tokens))
+        return or_(PG_TSVECTOR.op('@@')(tsquery), PG_DOCUMENT.ilike(_like_pattern(term), escape='\\'))
+    if backend == 'sqlite':
+        return Parcel.id.in_(
+            text("SELECT rowid FROM parcels_fts WHERE parcels_fts MATCH :match")
+            .bindparams(match=_fts_match(tokens))
+        )
+    pattern = _like_pattern(term)
+    return or_(*(getattr(Parcel, column).ilike(pattern, escape='\\') for column in SEARCH_COLUMNS))
+
+
+def _fts_match(tokens):
+    # Quoted prefix queries, ANDed: 'jane west' -> "jane"* "west"*
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def search_filter(query, term):
+    """Restricts a Parcel query to rows matching `term`, keeping its ordering."""
+    tokens = search_terms(term)
+    if not tokens:
+        return query.filter(false())
+    return query.filter(_criteria(term, tokens))
+
+
+def search_parcels(term, limit, offset=0):
+    """
+    Returns up to `limit` (parcel, rank) pairs for `term`, best match first.
+    Higher rank is better on every backend.
+    """
+    tokens = search_terms(term)
+    if not tokens:
+        return []
+
+    backend = _backend()
+    if backend == 'postgresql':
+        tsquery = func.to_tsquery('simple', ' & '.join(f'{token}:*' for token in tokens))
+        rank = func.ts_rank(PG_TSVECTOR, tsquery) + func.similarity(PG_DOCUMENT, term.strip())
+        query = db.session.query(Parcel, rank.label('rank')).filter(_criteria(term, tokens))
+    elif backend == 'sqlite':
+        hits = (
+            text("SELECT rowid, -bm25(parcels_fts) AS rank FROM parcels_fts WHERE parcels_fts MATCH :match")
+            .bindparams(match=_fts_match(tokens))
+            .columns(rowid=Integer, rank=Float)
+            .subquery('hits')
+        )
+        rank = hits.c.rank
+        query = db.session.query(Parcel, rank).join(hits, hits.c.rowid == Parcel.id)
+    else:
+        rank = literal(0.0)
+        query = db.session.query(Parcel, rank.label('rank')).filter(_criteria(term, tokens))
+
+    rows = query.order_by(rank.desc(), Parcel.id.desc()).offset(offset).limit(limit).all()
+    return [(parcel, round(float(score or 0), 4)) for parcel, score in rows]
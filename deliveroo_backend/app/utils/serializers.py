@@ -0,0 +1,87 @@
+"""
+Parcel serialization shared by the user and admin routes.
+
+List views select only the columns a response needs (`parcel_query`) and
+turn the resulting rows into dicts without hydrating ORM objects. The same
+`serialize_parcel` also accepts full Parcel instances.
+"""
+from functools import lru_cache
+
+from app.models.parcel import Parcel
+from app.utils.helpers import get_full_image_url, get_thumbnail_url
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+# Response field -> (column, transform applied to the column value)
+PARCEL_FIELDS = {
+    'id': (Parcel.id, None),
+    'user_id': (Parcel.user_id, None),
+    'recipient_name': (Parcel.recipient_name, None),
+    'pickup_location': (Parcel.pickup_location, None),
+    'destination': (Parcel.destination, None),
+    'weight': (Parcel.weight, None),
+    'status': (Parcel.status, None),
+    'present_location': (Parcel.present_location, None),
+    'created_at': (Parcel.created_at, _isoformat),
+    'sender_phone': (Parcel.sender_phone, None),
+    'recipient_phone': (Parcel.recipient_phone, None),
+    'estimated_cost': (Parcel.estimated_cost, None),  # Insured Value
+    'shipping_cost': (Parcel.shipping_cost, None),    # Calculated Cost
+    'parcel_image_url': (Parcel.parcel_image_url, get_full_image_url),
+    'proof_of_delivery_image_url': (Parcel.proof_of_delivery_image_url, get_full_image_url),
+    'parcel_image_thumbnail_url': (Parcel.parcel_image_url, get_thumbnail_url),
+    'proof_of_delivery_thumbnail_url': (Parcel.proof_of_delivery_image_url, get_thumbnail_url),
+}
+ADMIN_PARCEL_FIELDS = tuple(PARCEL_FIELDS)
+USER_PARCEL_FIELDS = tuple(name for name in PARCEL_FIELDS if name != 'user_id')
+
+# Always selected: paging needs (created_at, id) and access checks need user_id.
+_REQUIRED_COLUMNS = (Parcel.id, Parcel.user_id, Parcel.created_at)
+
+
+def select_fields(requested, allowed):
+    """
+    Parses a ?fields=a,b,c value against the fields a route may expose.
+    Returns `allowed` when nothing was requested. Raises ValueError.
+    """
+    if not requested:
+        return allowed
+    fields = tuple(dict.fromkeys(name.strip() for name in requested.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields or allowed
+
+
+@lru_cache(maxsize=64)
+def _plan(fields):
+    return tuple((name, PARCEL_FIELDS[name][0].key, PARCEL_FIELDS[name][1]) for name in fields)
+
+
+def parcel_query(query, fields):
+    """Narrows a Parcel query to the columns needed to serialize `fields`."""
+    columns = list(_REQUIRED_COLUMNS)
+    for name in fields:
+        column = PARCEL_FIELDS[name][0]
+        if column not in columns:
+            columns.append(column)
+    return query.with_entities(*columns)
+
+
+def serialize_parcel(row, fields):
+    """Builds the response dict for one projected row (or Parcel instance)."""
+    return {
+        name: transform(getattr(row, key)) if transform else getattr(row, key)
+        for name, key, transform in _plan(fields)
+    }
+
+
+def serialize_parcels(rows, fields):
+    plan = _plan(fields)
+    return [
+        {name: transform(getattr(row, key)) if transform else getattr(row, key) for name, key, transform in plan}
+        for row in rows
+    ]
@@ -0,0 +1,72 @@
+"""
+Serving of stored uploads.
+
+Content-addressed uploads (see storage.py) never change under the same
+name, so they are sent with their hash as a strong ETag and a year-long
+immutable Cache-Control; browsers and CDNs stop asking. Other files (legacy
+client-named uploads and rendered variants) get a strong ETag from their
+size and mtime and a shorter max-age. Range and If-None-Match requests are
+answered by werkzeug's conditional responses.
+
+With UPLOAD_SERVE_MODE set, the bytes do not pass through Python at all:
+
+    x-accel     Nginx. The response carries `X-Accel-Redirect:
+                <UPLOAD_ACCEL_PREFIX><path>`; map the prefix to the upload
+                folder with an `internal` location, e.g.
+                    location /_uploads/ { internal; alias /srv/deliveroo/uploads/; }
+    x-sendfile  Apache mod_xsendfile, lighttpd. Turns on Flask's USE_X_SENDFILE.
+"""
+import mimetypes
+import os
+import re
+
+from flask import abort, current_app, request, send_file
+from werkzeug.security import safe_join
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# <sha256[:2]>/<sha256><ext>, as written by UploadStore
+CONTENT_ADDRESSED = re.compile(r'^([0-9a-f]{2})/(\1[0-9a-f]{62})(\.[\w]+)?$')
+
+
+def serve_upload(name):
+    """Returns the response for `name`, relative to UPLOAD_FOLDER."""
+    config = current_app.config
+    path = safe_join(config['UPLOAD_FOLDER'], name)
+    if path is None:
+        abort(404)
+
+    match = CONTENT_ADDRESSED.match(name)
+    digest = match.group(2) if match else None
+    if digest and request.if_none_match.contains(digest):
+        # The name is the content; no need to touch the disk.
+        response = current_app.response_class(status=304)
+        return _cacheable(response, digest)
+
+    if not os.path.isfile(path):
+        abort(404)
+
+    if config.get('UPLOAD_SERVE_MODE') == 'x-accel':
+        # Nginx serves the file, including Range requests, and keeps our cache headers.
+        response = current_app.response_class(
+            mimetype=mimetypes.guess_type(name)[0] or 'application/octet-stream',
+            headers={'X-Accel-Redirect': config.get('UPLOAD_ACCEL_PREFIX', '/_uploads/') + name},
+        )
+        return _cacheable(response, digest)
+
+    # Handles Range and If-None-Match; sends only an X-Sendfile header when USE_X_SENDFILE is on.
+    response = send_file(
+        os.path.abspath(path), conditional=True, etag=digest or True,
+        max_age=config.get('UPLOAD_CACHE_SECONDS', 3600),
+    )
+    response.accept_ranges = 'bytes'
+    return _cacheable(response, digest)
+
+
+def _cacheable(response, digest):
+    if digest:
+        response.set_etag(digest)
+        response.headers['Cache-Control'] = IMMUTABLE
+    else:
+        response.cache_control.public = True
+        response.cache_control.max_age = current_app.config.get('UPLOAD_CACHE_SECONDS', 3600)
+    return response
@@ -0,0 +1,105 @@
+"""
+Content-addressed storage for uploaded images.
+
+Uploads are copied from the request in fixed-size chunks into a temporary
+file next to their final location, hashed on the way, and then renamed to
+`<sha256[:2]>/<sha256><ext>` in one atomic step. The same photo uploaded
+twice is stored once, two different photos that share a client filename
+no longer overwrite each other, and a reader never sees half a file.
+
+The stored name is relative to UPLOAD_FOLDER and is what the parcel
+columns hold; `get_full_image_url` and `/uploads/<path>` work unchanged.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+
+from werkzeug.utils import secure_filename
+
+
+class UploadTooLarge(Exception):
+    """The upload exceeded UPLOAD_MAX_BYTES. Nothing was stored."""
+
+
+class UploadStore:
+    """Streams werkzeug FileStorage objects into the content-addressed upload folder."""
+
+    def __init__(self, app=None):
+        self.root = None
+        self.max_bytes = 10 * 1024 * 1024
+        self.chunk_size = 64 * 1024
+        self._lock = threading.Lock()
+        self._counters = {'stored': 0, 'deduplicated': 0, 'rejected': 0, 'bytes_written': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.root = app.config['UPLOAD_FOLDER']
+        self.max_bytes = app.config.get('UPLOAD_MAX_BYTES', self.max_bytes)
+        self.chunk_size = app.config.get('UPLOAD_CHUNK_SIZE', self.chunk_size)
+        os.makedirs(self._tmp_dir(), exist_ok=True)
+        app.extensions['upload_store'] = self
+
+    def save(self, file):
+        """
+        Stores an uploaded file and returns its name relative to the upload
+        folder. Raises UploadTooLarge without storing anything.
+        """
+        # Keep the client's extension so /uploads serves the right Content-Type.
+        extension = os.path.splitext(secure_filename(file.filename or ''))[1].lower()[:10]
+
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self._tmp_dir())
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                while True:
+                    chunk = file.stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise UploadTooLarge(self.limit_message())
+                    digest.update(chunk)
+                    out.write(chunk)
+
+            name = self._name_for(digest.hexdigest(), extension)
+            path = os.path.join(self.root, name)
+            if os.path.exists(path):
+                self._count('deduplicated')
+                return name
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.chmod(tmp_path, 0o644)  # mkstemp creates files readable by the owner only
+            os.replace(tmp_path, path)
+            tmp_path = None
+            self._count('stored')
+            self._count('bytes_written', size)
+            return name
+        except UploadTooLarge:
+            self._count('rejected')
+            raise
+        finally:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def limit_message(self):
+        return f'Uploads are limited to {round(self.max_bytes / (1024 * 1024), 1):g} MB'
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, max_bytes=self.max_bytes)
+
+    def _name_for(self, sha256, extension):
+        # Two-character fan-out keeps any one directory small.
+        return f'{sha256[:2]}/{sha256}{extension}'
+
+    def _tmp_dir(self):
+        return os.path.join(self.root, '.tmp')
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+
+upload_store = UploadStore()
@@ -0,0 +1,10 @@
+"""
+ASGI entry point. Serves tracking streams on the event loop and everything
+else through the Flask app:
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+"""
+from run import app
+from app.asgi import StreamingApp
+
+application = StreamingApp(app)
@@ -10,14 +10,63 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     GEOAPIFY_API_KEY = os.environ.get('GEOAPIFY_API_KEY')
+    GEOAPIFY_BASE_URL = os.environ.get('GEOAPIFY_BASE_URL', 'https://api.geoapify.com')
+    GEOAPIFY_TIMEOUT = float(os.environ.get('GEOAPIFY_TIMEOUT', 3))
+    GEO_REQUEST_BUDGET = float(os.environ.get('GEO_REQUEST_BUDGET', 6))
+    GEO_BREAKER_FAILURES = int(os.environ.get('GEO_BREAKER_FAILURES', 5))
+    GEO_BREAKER_RESET_SECONDS = float(os.environ.get('GEO_BREAKER_RESET_SECONDS', 30))
+    GEO_SERVE_STALE = os.environ.get('GEO_SERVE_STALE', 'true').lower() in ['true', 'on', '1']
+    GEO_HTTP_POOL_SIZE = int(os.environ.get('GEO_HTTP_POOL_SIZE', 20))
+    GEO_WORKERS = int(os.environ.get('GEO_WORKERS', 8))
+    PARCEL_STREAM_INTERVAL = float(os.environ.get('PARCEL_STREAM_INTERVAL', 2))
+    PARCEL_STREAM_KEEPALIVE = float(os.environ.get('PARCEL_STREAM_KEEPALIVE', 15))
+    PARCEL_WATCH_MAX_IDS = int(os.environ.get('PARCEL_WATCH_MAX_IDS', 1000))
+    PARCEL_WATCH_SNAPSHOT_LIMIT = int(os.environ.get('PARCEL_WATCH_SNAPSHOT_LIMIT', 1000))
+    GEOCODE_CACHE_SIZE = int(os.environ.get('GEOCODE_CACHE_SIZE', 1024))
+    GEOCODE_CACHE_TTL = int(os.environ.get('GEOCODE_CACHE_TTL', 30 * 24 * 3600))
+    GEOCODE_NEGATIVE_TTL = int(os.environ.get('GEOCODE_NEGATIVE_TTL', 3600))
+    ROUTE_CACHE_SIZE = int(os.environ.get('ROUTE_CACHE_SIZE', 4096))
+    ROUTE_CACHE_TTL = int(os.environ.get('ROUTE_CACHE_TTL', 6 * 3600))
+    ROUTE_CACHE_GRID_METERS = float(os.environ.get('ROUTE_CACHE_GRID_METERS', 100))
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
     MAIL_PORT = int(os.environ.get('MAIL_PORT'))
     MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS').lower() in ['true', 'on', '1']
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER')
+    EMAIL_WORKERS = int(os.environ.get('EMAIL_WORKERS', 2))  # Started with the server; 0 leaves sending to `flask outbox drain`
+    EMAIL_BATCH_SIZE = int(os.environ.get('EMAIL_BATCH_SIZE', 50))
+    EMAIL_MAX_ATTEMPTS = int(os.environ.get('EMAIL_MAX_ATTEMPTS', 5))
+    EMAIL_RETRY_BASE_SECONDS = float(os.environ.get('EMAIL_RETRY_BASE_SECONDS', 30))
+    EMAIL_POLL_INTERVAL = float(os.environ.get('EMAIL_POLL_INTERVAL', 5))
+    EMAIL_SMTP_IDLE_SECONDS = float(os.environ.get('EMAIL_SMTP_IDLE_SECONDS', 30))
+    BULK_UPDATE_MAX = int(os.environ.get('BULK_UPDATE_MAX', 5000))
+    IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 1000))
+    IMPORT_MAX_BYTES = int(os.environ.get('IMPORT_MAX_BYTES', 200 * 1024 * 1024))
+    EXPORT_CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', 5000))
+    NOTIFY_COALESCE_SECONDS = float(os.environ.get('NOTIFY_COALESCE_SECONDS', 60))
+    UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER')  # Defaults to deliveroo_backend/uploads
+    UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', 10 * 1024 * 1024))
+    UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 64 * 1024))
+    # Rejects oversized request bodies up front (413) instead of parsing them; the
+    # extra megabyte leaves room for the multipart framing and other form fields.
+    MAX_CONTENT_LENGTH = UPLOAD_MAX_BYTES + 1024 * 1024
+    DERIVATIVE_WORKERS = int(os.environ.get('DERIVATIVE_WORKERS', 2))
+    DERIVATIVE_LAZY_TIMEOUT = float(os.environ.get('DERIVATIVE_LAZY_TIMEOUT', 10))
+    UPLOAD_SERVE_MODE = os.environ.get('UPLOAD_SERVE_MODE')  # None, 'x-accel' or 'x-sendfile'
+    UPLOAD_ACCEL_PREFIX = os.environ.get('UPLOAD_ACCEL_PREFIX', '/_uploads/')
+    UPLOAD_CACHE_SECONDS = int(os.environ.get('UPLOAD_CACHE_SECONDS', 3600))
+    USE_X_SENDFILE = UPLOAD_SERVE_MODE == 'x-sendfile'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=int(os.environ.get('JWT_ACCESS_EXPIRES_MINUTES', 50)))
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=int(os.environ.get('JWT_REFRESH_EXPIRES_DAYS', 30))) 
+    USER_FLAGS_TTL = float(os.environ.get('USER_FLAGS_TTL', 60))
+    USER_FLAGS_SYNC_SECONDS = float(os.environ.get('USER_FLAGS_SYNC_SECONDS', 2))  # Role changes reach other workers within this
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 0))  # 0: one per CPU
+    PASSWORD_HASH_MAX_QUEUE = int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', 64))
     STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY')
     STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET')
+    STRIPE_API_BASE = os.environ.get('STRIPE_API_BASE')  # e.g. tools/stripe_stub.py; unset means api.stripe.com
     JWT_TOKEN_LOCATION = ("headers", "query_string")
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # If set, /metrics needs "Authorization: Bearer <token>"
+    SERVER_TIMING = os.environ.get('SERVER_TIMING', 'false').lower() in ['true', 'on', '1']
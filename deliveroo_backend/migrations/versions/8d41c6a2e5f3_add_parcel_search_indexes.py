@@ -0,0 +1,72 @@
+"""Add parcel search indexes
+
+Revision ID: 8d41c6a2e5f3
+Revises: 5b8e2f4a7c10
+Create Date: 2026-10-17 13:47:03.220518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d41c6a2e5f3'
+down_revision = '5b8e2f4a7c10'
+branch_labels = None
+depends_on = None
+
+SEARCH_COLUMNS = (
+    'recipient_name', 'pickup_location', 'destination',
+    'present_location', 'sender_phone', 'recipient_phone',
+)
+# Kept in sync with PG_DOCUMENT in app/utils/search.py
+PG_DOCUMENT = " || ' ' || ".join(f"coalesce({column}, '')" for column in SEARCH_COLUMNS)
+
+
+def upgrade():
+    with op.batch_alter_table('parcels', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_parcels_status'), ['status'], unique=False)
+        batch_op.create_index(batch_op.f('ix_parcels_user_id'), ['user_id'], unique=False)
+
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.execute(f"CREATE INDEX ix_parcels_search_tsv ON parcels USING gin (to_tsvector('simple', {PG_DOCUMENT}))")
+        op.execute(f"CREATE INDEX ix_parcels_search_trgm ON parcels USING gin (({PG_DOCUMENT}) gin_trgm_ops)")
+    elif dialect == 'sqlite':
+        columns = ', '.join(SEARCH_COLUMNS)
+        new_values = ', '.join(f'new.{column}' for column in SEARCH_COLUMNS)
+        old_values = ', '.join(f'old.{column}' for column in SEARCH_COLUMNS)
+        op.execute(
+            f"CREATE VIRTUAL TABLE parcels_fts USING fts5({columns}, "
+            f"content='parcels', content_rowid='id', tokenize='unicode61')"
+        )
+        op.execute(
+            f"CREATE TRIGGER parcels_fts_insert AFTER INSERT ON parcels BEGIN "
+            f"INSERT INTO parcels_fts(rowid, {columns}) VALUES (new.id, {new_values}); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER parcels_fts_delete AFTER DELETE ON parcels BEGIN "
+            f"INSERT INTO parcels_fts(parcels_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER parcels_fts_update AFTER UPDATE ON parcels BEGIN "
+            f"INSERT INTO parcels_fts(parcels_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+            f"INSERT INTO parcels_fts(rowid, {columns}) VALUES (new.id, {new_values}); END"
+        )
+        op.execute("INSERT INTO parcels_fts(parcels_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_parcels_search_trgm')
+        op.execute('DROP INDEX IF EXISTS ix_parcels_search_tsv')
+    elif dialect == 'sqlite':
+        for trigger in ('parcels_fts_update', 'parcels_fts_delete', 'parcels_fts_insert'):
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        op.execute('DROP TABLE IF EXISTS parcels_fts')
+
+    with op.batch_alter_table('parcels', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_parcels_user_id'))
+        batch_op.drop_index(batch_op.f('ix_parcels_status'))
@@ -0,0 +1,372 @@
+"""
+End-to-end API benchmark, to catch a release that makes the main endpoints
+slower.
+
+Boots the app on a throwaway SQLite database seeded with a synthetic
+dataset, behind a local HTTP server, with the Geoapify, Stripe and SMTP
+stubs standing in for the real services. Each scenario is then driven at
+each concurrency level for a fixed time:
+
+    python -m tools.api_benchmark --parcels 50000 --concurrency 1 8 --seconds 10 \\
+        --output bench.json
+
+and a later run is compared against it with `--baseline bench.json`, which
+exits 1 when any p95 latency or throughput is worse by more than
+--tolerance. Results are JSON: throughput and p50/p95/p99 latency per
+scenario and concurrency.
+
+Clients and server share one process (and its GIL), so numbers are for
+comparing runs on the same machine, not for capacity planning.
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCENARIOS = (
+    'quote', 'create_parcel', 'list', 'admin_list', 'details', 'status_update', 'login', 'stream', 'payment',
+)
+STATUSES = ('Pending', 'In Transit', 'Out for Delivery', 'Delivered')
+PASSWORD = 'benchmark-password'
+# 1x1 PNG; each upload appends random bytes after IEND so every file is new.
+PNG = bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000d49444154789c6360f8cfc0f01f0005000201e2d2f1dc0000000049454e44ae426082'
+)
+ADDRESSES = [f'{n} {street}, Nairobi' for n in range(1, 41) for street in ('Moi Avenue', 'Ngong Road', 'Thika Road', 'Waiyaki Way', 'Mombasa Road')]
+
+
+def start_services(args):
+    """Starts the three stubs and points the app's config at them through the environment."""
+    from tools import geoapify_stub, smtp_stub, stripe_stub
+
+    geo, geo_url = geoapify_stub.start_stub_server(latency=args.geo_latency)
+    stripe, stripe_url = stripe_stub.start_stub_server(latency=args.stripe_latency)
+    smtp, smtp_port = smtp_stub.start_stub_server(latency=args.smtp_latency)
+    workdir = tempfile.mkdtemp(prefix='api-benchmark-')
+    os.environ.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        'UPLOAD_FOLDER': os.path.join(workdir, 'uploads'),
+        'GEOAPIFY_BASE_URL': geo_url,
+        'STRIPE_API_BASE': stripe_url,
+        'MAIL_SERVER': '127.0.0.1',
+        'MAIL_PORT': str(smtp_port),
+        'MAIL_USE_TLS': 'false',
+        'BCRYPT_LOG_ROUNDS': str(args.bcrypt_rounds),
+        'NOTIFY_COALESCE_SECONDS': '1',  # So status updates reach the SMTP sink during the run
+        'PARCEL_STREAM_KEEPALIVE': '1',  # Closed benchmark streams free their server thread quickly
+    })
+    for name, value in (('SECRET_KEY', 'benchmark'), ('JWT_SECRET_KEY', 'benchmark-' * 4),
+                        ('GEOAPIFY_API_KEY', 'benchmark'), ('STRIPE_SECRET_KEY', 'sk_test_benchmark'),
+                        ('MAIL_DEFAULT_SENDER', 'bench@example.com')):
+        os.environ.setdefault(name, value)
+    return workdir, {'geoapify': geo, 'stripe': stripe, 'smtp': smtp}
+
+
+def seed(db, users, parcels):
+    """Creates `users` customers and one admin, and `parcels` parcels spread over the last 90 days."""
+    from app.models.parcel import Parcel
+    from app.models.user import User
+    from app.utils.passwords import password_hasher
+    from app.utils.rollups import rebuild_rollups
+
+    db.create_all()
+    password_hash = password_hasher.hash(PASSWORD)  # One hash for everyone; bcrypt is slow on purpose
+    db.session.execute(User.__table__.insert(), [
+        {'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': password_hash, 'is_admin': False}
+        for i in range(1, users + 1)
+    ] + [{'username': 'admin', 'email': 'admin@example.com', 'password_hash': password_hash, 'is_admin': True}])
+
+    rng = random.Random(42)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    batch = []
+    for i in range(parcels):
+        batch.append({
+            'user_id': i % users + 1,  # Parcel IDs start at 1, so parcel N belongs to user (N - 1) % users + 1
+            'recipient_name': f'Recipient {i}',
+            'pickup_location': rng.choice(ADDRESSES),
+            'destination': rng.choice(ADDRESSES),
+            'weight': round(rng.uniform(0.2, 30), 2),
+            'status': rng.choice(STATUSES),
+            'present_location': rng.choice(ADDRESSES),
+            'created_at': now - timedelta(seconds=rng.randrange(90 * 86400)),
+            'sender_phone': '+254700000000',
+            'recipient_phone': f'+2547{i:08d}',
+            'estimated_cost': round(rng.uniform(10, 2000), 2),
+            'shipping_cost': round(rng.uniform(5, 80), 2),
+            'parcel_image_url': None,
+        })
+        if len(batch) == 5000:
+            db.session.execute(Parcel.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(Parcel.__table__.insert(), batch)
+    db.session.commit()
+    rebuild_rollups()
+
+
+def issue_tokens(app, users):
+    """Access tokens for each customer and the admin, minted the way login does."""
+    from flask_jwt_extended import create_access_token
+
+    with app.app_context():
+        tokens = {i: create_access_token(identity=str(i), additional_claims={'is_admin': False})
+                  for i in range(1, users + 1)}
+        tokens['admin'] = create_access_token(identity=str(users + 1), additional_claims={'is_admin': True})
+    return tokens
+
+
+class Client:
+    """One simulated user: a keep-alive session and the parcels it may read."""
+
+    def __init__(self, base_url, index, args, tokens):
+        self.base_url = base_url
+        self.session = requests.Session()
+        self.rng = random.Random(index)
+        self.user_id = index % args.users + 1
+        self.token = tokens[self.user_id]
+        self.admin_token = tokens['admin']
+        self.users = args.users
+        self.parcels = args.parcels
+
+    def own_parcel(self):
+        """A random seeded parcel belonging to this client's user."""
+        per_user = max(1, (self.parcels - self.user_id) // self.users + 1)
+        return self.user_id + self.users * self.rng.randrange(per_user)
+
+    def call(self, scenario):
+        """Runs one request of `scenario`. Returns the HTTP status."""
+        return getattr(self, scenario)()
+
+    def _request(self, method, path, token=None, **kwargs):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        response = self.session.request(method, self.base_url + path, headers=headers, timeout=30, **kwargs)
+        response.content  # Read the whole body; it is part of the latency
+        return response.status_code
+
+    def quote(self):
+        pickup, destination = self.rng.sample(ADDRESSES, 2)
+        return self._request('POST', '/api/quote', json={
+            'weight': self.rng.uniform(0.5, 20), 'pickup_location': pickup, 'destination': destination,
+        })
+
+    def create_parcel(self):
+        pickup, destination = self.rng.sample(ADDRESSES, 2)
+        return self._request('POST', '/api/parcels', self.token, data={
+            'recipient_name': 'Benchmark Recipient', 'pickup_location': pickup, 'destination': destination,
+            'weight': '2.5', 'sender_phone': '+254700000001', 'recipient_phone': '+254700000002',
+            'estimated_cost': '150', 'shipping_cost': '22.5',
+        }, files={'parcel_image': ('parcel.png', PNG + os.urandom(64), 'image/png')})
+
+    def list(self):
+        return self._request('GET', '/api/parcels', self.token)
+
+    def admin_list(self):
+        # The dashboard's first page; the unpaged list grows with --parcels.
+        return self._request('GET', '/admin/parcels', self.admin_token, params={'limit': 100})
+
+    def details(self):
+        return self._request('GET', f'/api/parcels/{self.own_parcel()}', self.token)
+
+    def status_update(self):
+        parcel_id = self.rng.randint(1, self.parcels)
+        return self._request('PATCH', f'/admin/parcels/{parcel_id}/status', self.admin_token,
+                             json={'status': self.rng.choice(STATUSES)})
+
+    def login(self):
+        return self._request('POST', '/api/auth/login', json={
+            'email': f'user{self.user_id}@example.com', 'password': PASSWORD,
+        })
+
+    def stream(self):
+        """Time to the first tracking event on a new stream; the stream is then closed."""
+        path = f'/api/parcels/{self.own_parcel()}/stream'
+        with self.session.get(self.base_url + path, params={'jwt': self.token}, stream=True, timeout=30) as response:
+            if response.status_code == 200:
+                for line in response.iter_lines():
+                    if line.startswith(b'data:'):
+                        break
+            return response.status_code
+
+    def payment(self):
+        return self._request('POST', '/api/create-payment-intent', self.token,
+                             json={'cost': round(self.rng.uniform(5, 80), 2)})
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def measure(base_url, scenario, concurrency, args, tokens):
+    """Drives `scenario` from `concurrency` clients for args.seconds. Returns its summary."""
+    clients = [Client(base_url, i, args, tokens) for i in range(concurrency)]
+    for client in clients[:1] * args.warmup:
+        client.call(scenario)  # Connections, caches and lazy imports
+
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+
+    def run(client):
+        mine, codes = [], {}
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                status = client.call(scenario)
+            except requests.RequestException as e:
+                status = type(e).__name__
+            mine.append((time.perf_counter() - started) * 1000)
+            codes[status] = codes.get(status, 0) + 1
+        with lock:
+            latencies.extend(mine)
+            for status, count in codes.items():
+                statuses[str(status)] = statuses.get(str(status), 0) + count
+
+    threads = [threading.Thread(target=run, args=(client,)) for client in clients]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    for client in clients:
+        client.session.close()
+
+    latencies.sort()
+    errors = sum(count for status, count in statuses.items() if not status.startswith(('2', '3')))
+    if not latencies:
+        return {'requests': 0, 'errors': errors, 'status_codes': statuses}
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'status_codes': statuses,
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'max_ms': round(latencies[-1], 2),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Lists every scenario/concurrency whose p95 or throughput is worse than `baseline` by more than `tolerance`."""
+    regressions = []
+    for scenario, levels in results.items():
+        for level, current in levels.items():
+            before = baseline.get('results', {}).get(scenario, {}).get(level)
+            if not before or not before.get('requests') or not current.get('requests'):
+                continue
+            if current['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+                regressions.append({'scenario': scenario, 'concurrency': int(level), 'metric': 'p95_ms',
+                                    'baseline': before['p95_ms'], 'current': current['p95_ms']})
+            if current['throughput_rps'] < before['throughput_rps'] / (1 + tolerance):
+                regressions.append({'scenario': scenario, 'concurrency': int(level), 'metric': 'throughput_rps',
+                                    'baseline': before['throughput_rps'], 'current': current['throughput_rps']})
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end API benchmark with stubbed external services')
+    parser.add_argument('--parcels', type=int, default=20000, help='Seeded parcels')
+    parser.add_argument('--users', type=int, default=200, help='Seeded customers')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--seconds', type=float, default=5, help='Duration of each measurement')
+    parser.add_argument('--warmup', type=int, default=3, help='Unmeasured requests before each measurement')
+    parser.add_argument('--bcrypt-rounds', type=int, default=12, help='BCRYPT_LOG_ROUNDS for seeding and login')
+    parser.add_argument('--geo-latency', type=float, default=0.0, help='Seconds the Geoapify stub waits')
+    parser.add_argument('--stripe-latency', type=float, default=0.0, help='Seconds the Stripe stub waits')
+    parser.add_argument('--smtp-latency', type=float, default=0.0, help='Seconds the SMTP sink waits')
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+    parser.add_argument('--baseline', help='Earlier report to compare against; exits 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown against the baseline')
+    args = parser.parse_args()
+
+    workdir, stubs = start_services(args)
+    from werkzeug.serving import make_server
+    from app import create_app, db
+
+    app = create_app()
+    with app.app_context():
+        seed(db, args.users, args.parcels)
+    tokens = issue_tokens(app, args.users)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)  # No per-request access log
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    results = {}
+    # The app prints request diagnostics; keep them out of the report.
+    with contextlib.redirect_stdout(io.StringIO()):
+        for scenario in args.scenarios:
+            results[scenario] = {
+                str(level): measure(base_url, scenario, level, args, tokens) for level in args.concurrency
+            }
+        time.sleep(2)  # Let coalesced status emails reach the SMTP sink
+    server.shutdown()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    stub_stats = {}
+    for name, stub in stubs.items():
+        with stub.stats_lock:
+            stub_stats[name] = dict(stub.stats)
+    report = {
+        'meta': {
+            'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'parcels': args.parcels,
+            'users': args.users,
+            'seconds': args.seconds,
+            'concurrency': args.concurrency,
+            'bcrypt_rounds': args.bcrypt_rounds,
+            'stub_latency_s': {'geoapify': args.geo_latency, 'stripe': args.stripe_latency, 'smtp': args.smtp_latency},
+        },
+        'results': results,
+        'stubs': stub_stats,
+    }
+    regressions = None
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            regressions = compare(results, json.load(baseline), args.tolerance)
+        report['regressions'] = regressions
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(text + '\n')
+    else:
+        print(text)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Local stand-in for the Geoapify geocoding and routing APIs.
+
+Answers /v1/geocode/search and /v1/routing with deterministic results so the
+geo client can be exercised without network access or an API key. Point the
+app at it with GEOAPIFY_BASE_URL=http://127.0.0.1:<port>.
+
+    python -m tools.geoapify_stub --port 8089 --latency 0.2
+"""
+import argparse
+import hashlib
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Every address is placed deterministically inside this box (roughly Nairobi).
+BASE_LAT, BASE_LON = -1.40, 36.70
+SPREAD_DEG = 0.40
+UNKNOWN_MARKER = 'nowhere'
+
+
+def coordinates_for(text):
+    digest = hashlib.sha256(text.strip().lower().encode('utf-8')).digest()
+    lat = BASE_LAT + SPREAD_DEG * int.from_bytes(digest[:4], 'big') / 2**32
+    lon = BASE_LON + SPREAD_DEG * int.from_bytes(digest[4:8], 'big') / 2**32
+    return round(lat, 6), round(lon, 6)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 6371.0 * 2 * math.asin(math.sqrt(a))
+
+
+class GeoapifyStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, so pooled clients reuse connections
+    disable_nagle_algorithm = True  # Headers and body go out in separate writes
+
+    def do_GET(self):
+        server = self.server
+        with server.stats_lock:
+            server.stats['requests'] += 1
+        if server.latency:
+            time.sleep(server.latency)
+        if server.fail:
+            return self._send(503, {'error': 'Service Unavailable'})
+
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if url.path == '/v1/geocode/search':
+            return self._geocode(query.get('text', ''))
+        if url.path == '/v1/routing':
+            return self._route(query.get('waypoints', ''))
+        return self._send(404, {'error': 'Not Found'})
+
+    def _geocode(self, text):
+        if not text or UNKNOWN_MARKER in text.lower():
+            return self._send(200, {'type': 'FeatureCollection', 'features': []})
+        lat, lon = coordinates_for(text)
+        return self._send(200, {
+            'type': 'FeatureCollection',
+            'features': [{'geometry': {'type': 'Point', 'coordinates': [lon, lat]}, 'properties': {'formatted': text}}],
+        })
+
+    def _route(self, waypoints):
+        try:
+            (lat1, lon1), (lat2, lon2) = [map(float, point.split(',')) for point in waypoints.split('|')]
+        except ValueError:
+            return self._send(400, {'error': 'Invalid waypoints'})
+        # Road distance is typically ~30% longer than the straight line; assume 40 km/h.
+        distance_m = haversine_km(lat1, lon1, lat2, lon2) * 1300
+        return self._send(200, {
+            'features': [{'properties': {'distance': distance_m, 'time': distance_m / (40000 / 3600)}}],
+        })
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(host='127.0.0.1', port=0, latency=0.0):
+    """Starts the stub on a background thread. Returns (server, base_url)."""
+    server = ThreadingHTTPServer((host, port), GeoapifyStubHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.fail = False
+    server.stats = {'requests': 0}
+    server.stats_lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to wait before each response')
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(args.host, args.port, args.latency)
+    print(f"Geoapify stub listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
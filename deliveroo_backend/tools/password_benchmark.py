@@ -0,0 +1,84 @@
+"""
+Measures login throughput (bcrypt checks per second) at each work factor,
+to choose BCRYPT_LOG_ROUNDS and PASSWORD_HASH_WORKERS for a machine.
+
+Checks run through the app's PasswordHasher, first on one worker (per-core
+cost) and then on one worker per CPU (what the pool can sustain):
+
+    python -m tools.password_benchmark --costs 10 11 12 13 --seconds 3
+
+Results are printed as JSON.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# config.py needs these at import time; no mail is sent.
+os.environ.setdefault('MAIL_PORT', '25')
+os.environ.setdefault('MAIL_USE_TLS', 'false')
+
+
+def run(hasher, password_hash, clients, seconds):
+    """Hammers `hasher.check` from `clients` threads for `seconds`. Returns latencies in ms."""
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            assert hasher.check(password_hash, 'correct horse battery staple')
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, time.perf_counter() - started
+
+
+def summarize(latencies, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'logins_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies), 1),
+        'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='bcrypt login throughput benchmark')
+    parser.add_argument('--costs', type=int, nargs='+', default=[10, 11, 12, 13])
+    parser.add_argument('--seconds', type=float, default=3, help='Duration of each measurement')
+    args = parser.parse_args()
+
+    from app.utils.passwords import PasswordHasher
+
+    cores = os.cpu_count() or 1
+    report = {'cpus': cores, 'costs': {}}
+    for cost in args.costs:
+        single = PasswordHasher()
+        single.rounds, single.workers = cost, 1
+        password_hash = single.hash('correct horse battery staple')
+
+        per_core = summarize(*run(single, password_hash, 1, args.seconds))
+        pool = PasswordHasher()
+        pool.rounds, pool.workers = cost, cores
+        # Twice as many clients as workers keeps the pool saturated.
+        saturated = summarize(*run(pool, password_hash, cores * 2, args.seconds))
+        saturated['avg_queue_wait_ms'] = pool.stats().get('avg_wait_ms')
+        report['costs'][cost] = {'per_core': per_core, 'all_cores': saturated}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
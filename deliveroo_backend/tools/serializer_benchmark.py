@@ -0,0 +1,137 @@
+"""
+Measures parcel list serialization throughput: the old per-route approach
+(full ORM objects, hand-built dicts, stdlib json) against the shared
+serializer (projected columns, `serialize_parcels`, the app's JSON provider).
+
+Runs against a throwaway SQLite database, so no services are needed:
+
+    python -m tools.serializer_benchmark --rows 100000
+
+Results are printed as JSON, in rows per second.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+
+def build_app(path):
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    os.environ.setdefault('JWT_SECRET_KEY', 'benchmark')
+    os.environ.setdefault('MAIL_PORT', '25')
+    os.environ.setdefault('MAIL_USE_TLS', 'false')
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app import create_app
+    return create_app()
+
+
+def seed(db, rows):
+    from app.models.parcel import Parcel
+    from app.models.user import User
+
+    db.create_all()
+    db.session.add(User(username='bench', email='bench@example.com', password_hash='x'))
+    db.session.flush()
+    batch = []
+    for i in range(rows):
+        batch.append({
+            'user_id': 1,
+            'recipient_name': f'Recipient {i}',
+            'pickup_location': 'Nairobi CBD',
+            'destination': f'Westlands {i % 50}',
+            'weight': 1.5 + i % 20,
+            'status': ('Pending', 'In Transit', 'Delivered')[i % 3],
+            'present_location': 'Thika Road',
+            'sender_phone': '+254700000000',
+            'recipient_phone': f'+2547{i:08d}',
+            'estimated_cost': 1000.0,
+            'shipping_cost': 350.0,
+            'parcel_image_url': f'{i}.jpg' if i % 4 == 0 else None,
+        })
+        if len(batch) == 5000:
+            db.session.execute(Parcel.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(Parcel.__table__.insert(), batch)
+    db.session.commit()
+
+
+def before(db):
+    """What get_all_parcels did before the shared serializer."""
+    from app.models.parcel import Parcel
+    from app.utils.helpers import get_full_image_url
+
+    output = []
+    for parcel in Parcel.query.order_by(Parcel.created_at.desc()).all():
+        output.append({
+            'id': parcel.id,
+            'user_id': parcel.user_id,
+            'recipient_name': parcel.recipient_name,
+            'pickup_location': parcel.pickup_location,
+            'destination': parcel.destination,
+            'weight': parcel.weight,
+            'status': parcel.status,
+            'present_location': parcel.present_location,
+            'created_at': parcel.created_at.isoformat(),
+            'sender_phone': parcel.sender_phone,
+            'recipient_phone': parcel.recipient_phone,
+            'estimated_cost': parcel.estimated_cost,
+            'shipping_cost': parcel.shipping_cost,
+            'parcel_image_url': get_full_image_url(parcel.parcel_image_url),
+            'proof_of_delivery_image_url': get_full_image_url(parcel.proof_of_delivery_image_url),
+        })
+    db.session.expunge_all()
+    return json.dumps({'parcels': output}, sort_keys=True, separators=(',', ':'))
+
+
+def after(app, fields):
+    from app.models.parcel import Parcel
+    from app.utils.pagination import newest_first
+    from app.utils.serializers import parcel_query, serialize_parcels
+
+    rows = newest_first(parcel_query(Parcel.query, fields)).all()
+    return app.json.dumps({'parcels': serialize_parcels(rows, fields)})
+
+
+def measure(fn, rows, repeat):
+    best = None
+    size = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        size = len(fn())
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return {'rows_per_second': round(rows / best), 'seconds': round(best, 3), 'bytes': size}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parcel serializer throughput benchmark')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3, help='Best of N runs is reported')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app = build_app(os.path.join(workdir, 'bench.db'))
+        from app import db
+        from app.utils.json_provider import orjson
+        from app.utils.serializers import ADMIN_PARCEL_FIELDS
+
+        with app.app_context():
+            seed(db, args.rows)
+            report = {
+                'rows': args.rows,
+                'json_backend': 'orjson' if orjson else 'json',
+                'before': measure(lambda: before(db), args.rows, args.repeat),
+                'after': measure(lambda: after(app, ADMIN_PARCEL_FIELDS), args.rows, args.repeat),
+                'after_fields_id_status': measure(lambda: after(app, ('id', 'status')), args.rows, args.repeat),
+            }
+            report['speedup'] = round(report['after']['rows_per_second'] / report['before']['rows_per_second'], 2)
+            db.session.remove()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
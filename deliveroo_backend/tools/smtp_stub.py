@@ -0,0 +1,109 @@
+"""
+Local SMTP sink for exercising the email outbox without a real mail server.
+
+Speaks just enough SMTP for smtplib / Flask-Mail, counts connections and
+messages, and can be told to fail. Point the app at it with
+MAIL_SERVER=127.0.0.1 MAIL_PORT=<port> MAIL_USE_TLS=false.
+
+    python -m tools.smtp_stub --port 8025 --latency 0.01
+
+Any other sink works too, e.g. `python -m aiosmtpd -n -l 127.0.0.1:8025`.
+"""
+import argparse
+import socketserver
+import threading
+import time
+from collections import deque
+
+REJECT_MARKER = 'reject'  # Recipients containing this get a permanent 550
+
+
+class SMTPStubHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        server = self.server
+        with server.stats_lock:
+            server.stats['connections'] += 1
+        self._reply('220 smtp-stub ready')
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('latin-1').strip()
+            verb = command[:4].upper()
+            if verb in ('EHLO', 'HELO'):
+                self._reply('250 smtp-stub')
+            elif verb == 'MAIL':
+                recipients = []
+                self._reply('250 OK')
+            elif verb == 'RCPT':
+                if REJECT_MARKER in command.lower():
+                    self._reply('550 No such user')
+                else:
+                    recipients.append(command.split(':', 1)[-1].strip(' <>'))
+                    self._reply('250 OK')
+            elif verb == 'DATA':
+                self._reply('354 End data with <CR><LF>.<CR><LF>')
+                size = 0
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data in (b'.\r\n', b'.\n'):
+                        break
+                    size += len(data)
+                if server.latency:
+                    time.sleep(server.latency)
+                if server.fail:
+                    self._reply('451 Temporary failure, try again later')
+                    continue
+                with server.stats_lock:
+                    server.stats['messages'] += 1
+                    server.stats['bytes'] += size
+                    server.messages.append(tuple(recipients))
+                self._reply('250 Queued')
+            elif verb in ('RSET', 'NOOP'):
+                self._reply('250 OK')
+            elif verb == 'QUIT':
+                self._reply('221 Bye')
+                return
+            else:
+                self._reply('502 Command not implemented')
+
+    def _reply(self, text):
+        self.wfile.write(f'{text}\r\n'.encode('latin-1'))
+        self.wfile.flush()
+
+
+class SMTPStubServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def start_stub_server(host='127.0.0.1', port=0, latency=0.0):
+    """Starts the stub on a background thread. Returns (server, port)."""
+    server = SMTPStubServer((host, port), SMTPStubHandler)
+    server.latency = latency
+    server.fail = False
+    server.stats = {'connections': 0, 'messages': 0, 'bytes': 0}
+    server.messages = deque(maxlen=10000)  # Recipients of each accepted message
+    server.stats_lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.server_address[1]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8025)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to wait before accepting each message')
+    args = parser.parse_args()
+
+    server, port = start_stub_server(args.host, args.port, args.latency)
+    print(f"SMTP stub listening on {args.host}:{port}")
+    try:
+        while True:
+            time.sleep(10)
+            with server.stats_lock:
+                print(dict(server.stats), flush=True)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,127 @@
+"""
+Opens many concurrent tracking streams against a running server and reports
+how many it holds and what each one costs in server memory.
+
+Start the ASGI server in one shell and note its PID:
+
+    uvicorn asgi:application --port 8000
+
+then, from another:
+
+    python -m tools.sse_load_test --url http://127.0.0.1:8000 --token <access token> \\
+        --parcel-id 1 --connections 5000 --hold 30 --server-pid <pid>
+
+Results are printed as JSON. Raise `ulimit -n` on both sides for large runs.
+"""
+import argparse
+import asyncio
+import json
+import resource
+import time
+from urllib.parse import urlparse
+
+
+def rss_bytes(pid):
+    """Resident set size of a local process, read from /proc (Linux only)."""
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+async def open_stream(host, port, path, results):
+    started = time.monotonic()
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(
+            f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\n"
+            f"Accept: text/event-stream\r\nConnection: keep-alive\r\n\r\n".encode('latin-1')
+        )
+        await writer.drain()
+        status_line = await reader.readline()
+        if b' 200 ' not in status_line:
+            results['failed'] += 1
+            writer.close()
+            return None
+        # Wait for the first event (or keepalive) so the stream is fully set up.
+        while True:
+            line = await reader.readline()
+            if not line:  # Closed before the first event
+                raise asyncio.IncompleteReadError(b'', None)
+            if line.startswith((b'data:', b':')):
+                break
+    except (OSError, asyncio.IncompleteReadError) as e:
+        results['failed'] += 1
+        results['errors'].add(type(e).__name__)
+        return None
+    results['connected'] += 1
+    results['first_event_s'].append(time.monotonic() - started)
+    return reader, writer
+
+
+async def drain(reader):
+    try:
+        while await reader.read(4096):
+            pass
+    except (OSError, asyncio.CancelledError):
+        pass
+
+
+async def run(args):
+    url = urlparse(args.url)
+    host, port = url.hostname, url.port or 80
+    path = f"/api/parcels/{args.parcel_id}/stream?jwt={args.token}"
+    results = {'connected': 0, 'failed': 0, 'errors': set(), 'first_event_s': []}
+
+    baseline_rss = rss_bytes(args.server_pid) if args.server_pid else None
+    streams = []
+    for offset in range(0, args.connections, args.batch):
+        batch = min(args.batch, args.connections - offset)
+        opened = await asyncio.gather(*(open_stream(host, port, path, results) for _ in range(batch)))
+        streams.extend(stream for stream in opened if stream)
+
+    readers = [asyncio.ensure_future(drain(reader)) for reader, _ in streams]
+    await asyncio.sleep(args.hold)
+    loaded_rss = rss_bytes(args.server_pid) if args.server_pid else None
+
+    for task in readers:
+        task.cancel()
+    for _, writer in streams:
+        writer.close()
+
+    latencies = sorted(results['first_event_s'])
+    report = {
+        'requested': args.connections,
+        'connected': results['connected'],
+        'failed': results['failed'],
+        'errors': sorted(results['errors']),
+        'held_seconds': args.hold,
+        'first_event_p50_ms': round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+        'first_event_p99_ms': round(latencies[int(len(latencies) * 0.99)] * 1000, 1) if latencies else None,
+    }
+    if baseline_rss and loaded_rss:
+        report['server_rss_baseline_mb'] = round(baseline_rss / 2**20, 1)
+        report['server_rss_loaded_mb'] = round(loaded_rss / 2**20, 1)
+        if results['connected']:
+            report['server_bytes_per_connection'] = (loaded_rss - baseline_rss) // results['connected']
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Concurrent SSE tracking-stream load test')
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--token', required=True, help='Access token of the parcel owner or an admin')
+    parser.add_argument('--parcel-id', type=int, required=True)
+    parser.add_argument('--connections', type=int, default=1000)
+    parser.add_argument('--batch', type=int, default=200, help='Connections opened concurrently per batch')
+    parser.add_argument('--hold', type=float, default=10, help='Seconds to keep all streams open')
+    parser.add_argument('--server-pid', type=int, help='Server PID, to measure its memory per connection')
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    asyncio.run(run(args))
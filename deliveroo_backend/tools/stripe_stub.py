@@ -0,0 +1,118 @@
+"""
+Local stand-in for the Stripe PaymentIntents API.
+
+Answers POST /v1/payment_intents with a new PaymentIntent (and GET
+/v1/payment_intents/<id> with it again) so checkout can be exercised
+without network access or a real secret key. Point the app at it with
+STRIPE_API_BASE=http://127.0.0.1:<port>.
+
+    python -m tools.stripe_stub --port 8090 --latency 0.15
+"""
+import argparse
+import itertools
+import json
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class StripeStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, so pooled clients reuse connections
+    disable_nagle_algorithm = True  # Headers and body go out in separate writes
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        form = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode('utf-8')).items()}
+        if not self._begin():
+            return
+        if urlparse(self.path).path != '/v1/payment_intents':
+            return self._error(404, 'invalid_request_error', 'Unrecognized request URL')
+        try:
+            amount = int(form.get('amount', ''))
+        except ValueError:
+            return self._error(400, 'invalid_request_error', 'Missing required param: amount.')
+        if amount < 50:
+            return self._error(400, 'invalid_request_error', 'Amount must be at least 50 cents')
+
+        server = self.server
+        intent_id = f"pi_stub{next(server.ids):014d}"
+        intent = {
+            'id': intent_id,
+            'object': 'payment_intent',
+            'amount': amount,
+            'currency': form.get('currency', 'usd'),
+            'status': 'requires_payment_method',
+            'client_secret': f"{intent_id}_secret_{secrets.token_hex(12)}",
+            'created': int(time.time()),
+            'livemode': False,
+        }
+        with server.stats_lock:
+            server.intents[intent_id] = intent
+        return self._send(200, intent)
+
+    def do_GET(self):
+        if not self._begin():
+            return
+        path = urlparse(self.path).path
+        with self.server.stats_lock:
+            intent = self.server.intents.get(path.rsplit('/', 1)[-1]) if path.startswith('/v1/payment_intents/') else None
+        if intent is None:
+            return self._error(404, 'invalid_request_error', 'No such payment_intent')
+        return self._send(200, intent)
+
+    def _begin(self):
+        server = self.server
+        with server.stats_lock:
+            server.stats['requests'] += 1
+        if server.latency:
+            time.sleep(server.latency)
+        if server.fail:
+            self._error(500, 'api_error', 'Stub configured to fail')
+            return False
+        return True
+
+    def _error(self, status, kind, message):
+        return self._send(status, {'error': {'type': kind, 'message': message}})
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Request-Id', f"req_stub{secrets.token_hex(6)}")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(host='127.0.0.1', port=0, latency=0.0):
+    """Starts the stub on a background thread. Returns (server, base_url)."""
+    server = ThreadingHTTPServer((host, port), StripeStubHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.fail = False
+    server.ids = itertools.count(1)
+    server.intents = {}
+    server.stats = {'requests': 0}
+    server.stats_lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to wait before each response')
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(args.host, args.port, args.latency)
+    print(f"Stripe stub listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()